@@ -0,0 +1,113 @@
+"""Сравнение SQLiteCache с LocMemCache и FileBasedCache.
+
+Запуск из каталога yatube/:
+
+    python -m benchmarks.cache_backends --ops 20000 --workers 4
+
+Для каждого бэкенда меряется пропускная способность set/get/get_many/incr
+в одном процессе и доля попаданий, когда ключи записал один процесс, а
+читают другие воркеры (у LocMemCache она всегда нулевая).
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+os.environ.setdefault('KEY', 'benchmark')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache.backends.filebased import FileBasedCache  # noqa: E402
+from django.core.cache.backends.locmem import LocMemCache  # noqa: E402
+
+from yatube.sqlite_cache import SQLiteCache  # noqa: E402
+
+VALUE = {'html': 'x' * 2000, 'generation': 1}
+
+
+BACKENDS = ('locmem', 'filebased', 'sqlite')
+
+
+def make_cache(name, directory, max_entries):
+    params = {'OPTIONS': {'MAX_ENTRIES': max_entries}}
+    if name == 'locmem':
+        return LocMemCache('benchmark', params)
+    if name == 'filebased':
+        return FileBasedCache(os.path.join(directory, 'files'), params)
+    return SQLiteCache(os.path.join(directory, 'cache.sqlite3'), params)
+
+
+def throughput(cache, ops):
+    keys = [f'key:{i}' for i in range(ops)]
+    results = {}
+    started = time.perf_counter()
+    for key in keys:
+        cache.set(key, VALUE)
+    results['set'] = ops / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    results['get'] = ops / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for start in range(0, ops, 10):
+        cache.get_many(keys[start:start + 10])
+    results['get_many(10)'] = ops / (time.perf_counter() - started)
+    cache.set('counter', 0)
+    started = time.perf_counter()
+    for _ in range(ops):
+        cache.incr('counter')
+    results['incr'] = ops / (time.perf_counter() - started)
+    return results
+
+
+def read_shared(spec, keys, queue):
+    cache = make_cache(*spec)
+    queue.put(sum(cache.get(key) is not None for key in keys))
+
+
+def shared_hit_rate(spec, workers, keys_count):
+    keys = [f'shared:{i}' for i in range(keys_count)]
+    cache = make_cache(*spec)
+    for key in keys:
+        cache.set(key, VALUE)
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    processes = [context.Process(target=read_shared,
+                                 args=(spec, keys, queue))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    hits = sum(queue.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return hits / (workers * keys_count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ops', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        print(f'{"backend":<10} {"set/s":>10} {"get/s":>10} '
+              f'{"get_many/s":>11} {"incr/s":>10} {"shared hits":>12}')
+        for name in BACKENDS:
+            spec = (name, directory, args.ops * 2)
+            results = throughput(make_cache(*spec), args.ops)
+            hits = shared_hit_rate(spec, args.workers, 200)
+            print(f'{name:<10} {results["set"]:>10.0f} {results["get"]:>10.0f}'
+                  f' {results["get_many(10)"]:>11.0f} {results["incr"]:>10.0f}'
+                  f' {hits:>11.0%}')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Синхронные и async-вьюхи чтения под локальным ASGI-сервером.
+
+Запуск из каталога yatube/ (нужен uvicorn: pip install uvicorn):
+
+    python -m benchmarks.concurrency --concurrency 1 8 32
+
+Для каждого режима (sync — views.py, async — async_views.py) поднимается
+uvicorn с одним процессом и настройками benchmarks.server_settings, после
+чего каждая вьюха получает --requests запросов от --concurrency
+одновременных клиентов с сессией пользователя (кэш страниц для анонимов
+не участвует). Меряются запросы в секунду и p50/p95/p99 задержки. База та
+же, что у benchmarks.views; кэш — отдельный временный файл.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {'sync': '0', 'async': '1'}
+READ_VIEWS = ('index', 'group_posts', 'profile', 'post_view', 'follow_index')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+        '--database', default=os.path.join(BASE_DIR, 'benchmark.sqlite3'))
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 8, 32])
+    parser.add_argument('--modes', nargs='+', choices=MODES,
+                        default=list(MODES))
+    parser.add_argument('--views', nargs='*', choices=READ_VIEWS,
+                        help='Только эти вьюхи (по умолчанию все)')
+    parser.add_argument('--output', help='Куда сохранить результаты (JSON)')
+    seed = parser.add_argument_group('наполнение новой базы')
+    seed.add_argument('--users', type=int, default=2000)
+    seed.add_argument('--posts', type=int, default=20000)
+    seed.add_argument('--comments', type=int, default=40000)
+    seed.add_argument('--follows', type=int, default=40000)
+    return parser.parse_args()
+
+
+ARGS = parse_args() if __name__ == '__main__' else None
+if ARGS is not None:
+    os.environ['DATABASE_NAME'] = ARGS.database
+
+from benchmarks.views import prepare_database, reader, scenarios  # noqa
+from django.test import Client  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, database, cache_location):
+    port = free_port()
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='benchmarks.server_settings',
+        ASYNC_READ_VIEWS=MODES[mode],
+        DATABASE_NAME=database,
+        CACHE_LOCATION=cache_location,
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'yatube.asgi:application',
+         '--port', str(port), '--workers', '1', '--log-level', 'warning'],
+        cwd=BASE_DIR, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(
+                f'uvicorn завершился с кодом {server.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('uvicorn не запустился за 30 с')
+
+
+def fetch(port, url, cookie):
+    """Один GET по новому соединению: секунды или None при ошибке."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    started = time.perf_counter()
+    try:
+        connection.request('GET', url, headers={'Cookie': cookie})
+        response = connection.getresponse()
+        response.read()
+    except OSError:
+        return None
+    finally:
+        connection.close()
+    if response.status != 200:
+        return None
+    return time.perf_counter() - started
+
+
+def measure(port, url, cookie, requests, concurrency):
+    for _ in range(min(concurrency, 5)):
+        fetch(port, url, cookie)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        timings = list(pool.map(
+            lambda _: fetch(port, url, cookie), range(requests)))
+        elapsed = time.perf_counter() - started
+    ok = [timing * 1000 for timing in timings if timing is not None]
+    if len(ok) < 2:
+        return {'rps': 0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None,
+                'errors': requests - len(ok)}
+    cuts = statistics.quantiles(ok, n=100, method='inclusive')
+    return {
+        'rps': round(len(ok) / elapsed, 1),
+        'p50_ms': round(cuts[49], 3),
+        'p95_ms': round(cuts[94], 3),
+        'p99_ms': round(cuts[98], 3),
+        'errors': requests - len(ok),
+    }
+
+
+def session_cookie():
+    client = Client()
+    client.force_login(reader())
+    return f'sessionid={client.cookies["sessionid"].value}'
+
+
+def report(results):
+    print(f'{"view":<14} {"mode":<6} {"clients":>7} {"req/s":>8} '
+          f'{"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"errors":>6}')
+    for view, modes in results.items():
+        for mode, levels in modes.items():
+            for level, row in levels.items():
+                timings = ''.join(
+                    f' {row[name]:>9.2f}' if row[name] is not None
+                    else f' {"-":>9}'
+                    for name in ('p50_ms', 'p95_ms', 'p99_ms'))
+                print(f'{view:<14} {mode:<6} {level:>7} {row["rps"]:>8.1f}'
+                      f'{timings} {row["errors"]:>6}')
+
+
+def main(args):
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        print('Нужен uvicorn: pip install uvicorn', file=sys.stderr)
+        return 2
+    prepare_database(args)
+    urls = {name: url for name, (method, url, data) in scenarios().items()
+            if name in (args.views or READ_VIEWS)}
+    cookie = session_cookie()
+    results = {name: {} for name in urls}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in args.modes:
+            cache_location = os.path.join(directory, f'{mode}.sqlite3')
+            server, port = start_server(mode, args.database, cache_location)
+            try:
+                for name, url in urls.items():
+                    results[name][mode] = {
+                        level: measure(port, url, cookie, args.requests, level)
+                        for level in args.concurrency
+                    }
+            finally:
+                server.terminate()
+                server.wait()
+    report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({
+                'meta': {
+                    'database': args.database,
+                    'requests': args.requests,
+                    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                },
+                'views': results,
+            }, file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(ARGS))
@@ -0,0 +1,6 @@
+"""Настройки сервера для benchmarks.concurrency: профиль продакшена.
+
+Без этого debug_toolbar встраивался бы в ответы для 127.0.0.1, а его
+синхронный middleware заставлял бы async-вьюхи работать через поток.
+"""
+from yatube.settings_production import *  # noqa: F401,F403
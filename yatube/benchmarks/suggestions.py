@@ -0,0 +1,132 @@
+"""Пересчёт «Кого читать» на синтетическом графе подписок.
+
+Запуск из каталога yatube/ (нужны numpy и scipy):
+
+    python -m benchmarks.suggestions --edges 1000000 --users 100000
+
+Граф строится в памяти: читатели равномерные, популярность авторов
+убывает степенно (--skew), самоподписки и повторы отброшены. Меряется
+posts.suggestions.iter_top_k — время, порций, подсказок и пик памяти
+процесса. С --sql-users N те же подсказки для N случайных читателей
+считаются самосоединением подписок в SQLite по индексам, как делала бы
+вьюха на каждый запрос; результаты сверяются с матричными.
+"""
+import argparse
+import os
+import resource
+import sqlite3
+import sys
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+os.environ.setdefault('KEY', 'benchmark')
+
+import django  # noqa: E402
+
+django.setup()
+
+from posts import suggestions  # noqa: E402
+
+SELF_JOIN_SQL = """
+SELECT f2.author_id, COUNT(*) AS score
+FROM follow f1 JOIN follow f2 ON f2.user_id = f1.author_id
+WHERE f1.user_id = :user AND f2.author_id != :user
+  AND f2.author_id NOT IN (SELECT author_id FROM follow WHERE user_id = :user)
+GROUP BY f2.author_id
+ORDER BY score DESC, f2.author_id
+LIMIT :k
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--edges', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--skew', type=float, default=0.8,
+                        help='Показатель степени популярности авторов')
+    parser.add_argument('--top-k', type=int, default=suggestions.TOP_K)
+    parser.add_argument('--batch-size', type=int,
+                        default=suggestions.BATCH_SIZE)
+    parser.add_argument('--sql-users', type=int, default=0,
+                        help='Сверить и замерить самосоединение в SQLite')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def graph(np, args):
+    rng = np.random.default_rng(args.seed)
+    weights = 1 / np.arange(1, args.users + 1) ** args.skew
+    users = rng.integers(1, args.users + 1, args.edges, dtype=np.int64)
+    authors = rng.choice(np.arange(1, args.users + 1), args.edges,
+                         p=weights / weights.sum())
+    keys = np.unique(users * (args.users + 1) + authors)
+    users, authors = keys // (args.users + 1), keys % (args.users + 1)
+    keep = users != authors
+    return users[keep].astype(np.int32), authors[keep].astype(np.int32)
+
+
+def peak_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def self_join(users, authors, sample, top_k):
+    """Подсказки самосоединением: {читатель: [(автор, оценка)]}, секунды."""
+    db = sqlite3.connect(':memory:')
+    db.execute('CREATE TABLE follow (user_id INTEGER, author_id INTEGER)')
+    db.executemany('INSERT INTO follow VALUES (?, ?)',
+                   zip(users.tolist(), authors.tolist()))
+    db.execute('CREATE INDEX follow_user ON follow (user_id, author_id)')
+    timings, found = [], {}
+    for user in sample:
+        started = time.perf_counter()
+        found[user] = db.execute(
+            SELF_JOIN_SQL, {'user': user, 'k': top_k}).fetchall()
+        timings.append(time.perf_counter() - started)
+    return found, timings
+
+
+def main(args):
+    try:
+        np, _ = suggestions._numpy()
+    except ImportError:
+        print('Нужны numpy и scipy: pip install numpy scipy', file=sys.stderr)
+        return 2
+    started = time.perf_counter()
+    users, authors = graph(np, args)
+    print(f'Граф: {len(users)} подписок, {len(np.unique(users))} читателей '
+          f'за {time.perf_counter() - started:.1f} с')
+
+    started = time.perf_counter()
+    batches = total = 0
+    result = {}
+    for readers, suggested, scores in suggestions.iter_top_k(
+            users, authors, args.top_k, args.batch_size):
+        batches += 1
+        total += len(readers)
+        if args.sql_users:
+            for user, author, score in zip(
+                    readers.tolist(), suggested.tolist(), scores.tolist()):
+                result.setdefault(user, []).append((author, score))
+    elapsed = time.perf_counter() - started
+    print(f'Матрицы: {total} подсказок, {batches} порций за {elapsed:.1f} с, '
+          f'пик памяти {peak_rss_mib():.0f} МиБ')
+
+    if args.sql_users:
+        rng = np.random.default_rng(args.seed + 1)
+        sample = rng.choice(np.unique(users), args.sql_users,
+                            replace=False).tolist()
+        found, timings = self_join(users, authors, sample, args.top_k)
+        mismatched = [user for user in sample
+                      if found[user] != result.get(user, [])]
+        mean_ms = sum(timings) / len(timings) * 1000
+        print(f'SQLite: {mean_ms:.1f} мс на читателя в среднем, '
+              f'максимум {max(timings) * 1000:.1f} мс; '
+              f'расхождений с матрицами: {len(mismatched)}')
+        if mismatched:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
@@ -0,0 +1,119 @@
+"""Где тратится время отрисовки шаблонов страниц чтения.
+
+Запуск из каталога yatube/:
+
+    python -m benchmarks.templates --cold --limit 15
+
+Страницы из benchmarks.views (база та же) запрашиваются --requests раз с
+включённым yatube.template_profiler. Для каждого узла include, cache,
+feedcache и thumbnail печатаются число отрисовок на запрос, собственное
+время (без вложенных профилируемых узлов) и полное время на запрос.
+С --cold кэш очищается перед каждым запросом, и фрагменты {% feedcache %}
+отрисовываются заново, как при смене поколения.
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READ_VIEWS = ('index', 'group_posts', 'profile', 'post_view', 'follow_index')
+NODE_METRICS = (
+    'yatube_template_node_renders_total',
+    'yatube_template_node_self_seconds_total',
+    'yatube_template_node_seconds_total',
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+        '--database', default=os.path.join(BASE_DIR, 'benchmark.sqlite3'))
+    parser.add_argument(
+        '--cache', default=os.path.join(BASE_DIR, 'benchmark-cache.sqlite3'),
+        help='Файл общего кэша: --cold очищает его, а не кэш рабочей копии')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--cold', action='store_true',
+                        help='Очищать кэш перед каждым запросом')
+    parser.add_argument('--views', nargs='*', choices=READ_VIEWS,
+                        help='Только эти вьюхи (по умолчанию все)')
+    parser.add_argument('--limit', type=int, default=10,
+                        help='Узлов на вьюху')
+    seed = parser.add_argument_group('наполнение новой базы')
+    seed.add_argument('--users', type=int, default=2000)
+    seed.add_argument('--posts', type=int, default=20000)
+    seed.add_argument('--comments', type=int, default=40000)
+    seed.add_argument('--follows', type=int, default=40000)
+    return parser.parse_args()
+
+
+ARGS = parse_args() if __name__ == '__main__' else None
+if ARGS is not None:
+    os.environ['DATABASE_NAME'] = ARGS.database
+    os.environ['CACHE_LOCATION'] = ARGS.cache
+
+from benchmarks.views import prepare_database, reader, scenarios  # noqa
+from django.core.cache import cache  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+
+from yatube import metrics, template_profiler  # noqa: E402
+
+
+def node_times():
+    """{(шаблон:строка, тег): [отрисовок, собственное, полное]}."""
+    snapshot = metrics.snapshot()
+    nodes = {}
+    for index, name in enumerate(NODE_METRICS):
+        for (metric, labels), values in snapshot.items():
+            if metric == name:
+                row = nodes.setdefault(
+                    tuple(value for _, value in labels), [0, 0.0, 0.0])
+                row[index] = values[0]
+    return nodes
+
+
+def profile(client, url, requests, cold):
+    before = node_times()
+    for _ in range(requests):
+        if cold:
+            cache.clear()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url}: {response.status_code}')
+    rows = []
+    for node, values in node_times().items():
+        old = before.get(node, [0, 0.0, 0.0])
+        delta = [(new - was) / requests for new, was in zip(values, old)]
+        if delta[0]:
+            rows.append((node, delta))
+    return sorted(rows, key=lambda row: row[1][1], reverse=True)
+
+
+def report(name, rows, limit):
+    print(f'\n{name}')
+    print(f'{"renders":>8} {"self ms":>9} {"total ms":>9}  узел')
+    for (where, tag), (renders, own, total) in rows[:limit]:
+        print(f'{renders:>8.1f} {own * 1000:>9.3f} {total * 1000:>9.3f}  '
+              f'{where} {{% {tag} %}}')
+
+
+def main(args):
+    prepare_database(args)
+    client = Client()
+    client.force_login(reader())
+    urls = {name: url for name, (method, url, data) in scenarios().items()
+            if name in (args.views or READ_VIEWS)}
+    template_profiler.enable()
+    try:
+        with override_settings(DEBUG=False):
+            for name, url in urls.items():
+                client.get(url)
+                report(name, profile(client, url, args.requests, args.cold),
+                       args.limit)
+    finally:
+        template_profiler.disable()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(ARGS))
@@ -0,0 +1,268 @@
+"""Бенчмарк вьюх posts через тестовый клиент Django на наполненной базе.
+
+Запуск из каталога yatube/:
+
+    python -m benchmarks.views --output before.json
+    python -m benchmarks.views --baseline before.json --threshold 1.2
+
+База берётся из --database (по умолчанию benchmark.sqlite3 рядом с
+manage.py); если её нет, она создаётся миграциями и наполняется
+seed_yatube с фиксированным seed. Общий кэш — свой файл (--cache), так что
+--cold не стирает кэш рабочей копии. Для каждой вьюхи меряются p50/p95/p99
+времени ответа, число запросов к базе и пик выделенной за запрос памяти
+(tracemalloc, отдельным проходом, чтобы не искажать время). Пишущие вьюхи
+выполняются в транзакции, которая откатывается, поэтому база от прогона к
+прогону не меняется.
+
+С --baseline вьюха считается деградировавшей, если её --metric вырос больше
+чем в --threshold раз или запросов стало больше; тогда код выхода 1.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def at_least(minimum):
+    """Тип argparse: целое не меньше minimum."""
+    def parse(value):
+        number = int(value)
+        if number < minimum:
+            raise argparse.ArgumentTypeError(f'нужно не меньше {minimum}')
+        return number
+    return parse
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+        '--database', default=os.path.join(BASE_DIR, 'benchmark.sqlite3'))
+    parser.add_argument(
+        '--cache', default=os.path.join(BASE_DIR, 'benchmark-cache.sqlite3'),
+        help='Файл общего кэша: --cold очищает его, а не кэш рабочей копии')
+    parser.add_argument(
+        '--requests', type=at_least(2), default=100,
+        help='Замеров на вьюху; перцентилям нужно хотя бы два')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--alloc-requests', type=at_least(1), default=10)
+    parser.add_argument('--cold', action='store_true',
+                        help='Очищать кэш перед каждым запросом')
+    parser.add_argument('--views', nargs='*',
+                        help='Только эти вьюхи (по умолчанию все)')
+    parser.add_argument('--output', help='Куда сохранить результаты (JSON)')
+    parser.add_argument('--baseline', help='Результаты для сравнения')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--metric', default='p95_ms',
+                        choices=('p50_ms', 'p95_ms', 'p99_ms'))
+    seed = parser.add_argument_group('наполнение новой базы')
+    seed.add_argument('--users', type=int, default=2000)
+    seed.add_argument('--posts', type=int, default=20000)
+    seed.add_argument('--comments', type=int, default=40000)
+    seed.add_argument('--follows', type=int, default=40000)
+    return parser.parse_args()
+
+
+ARGS = parse_args() if __name__ == '__main__' else None
+if ARGS is not None:
+    os.environ['DATABASE_NAME'] = ARGS.database
+    os.environ['CACHE_LOCATION'] = ARGS.cache
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+os.environ.setdefault('KEY', 'benchmark')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from posts.models import AuthorStats, Group, Post  # noqa: E402
+
+User = get_user_model()
+
+
+def prepare_database(args):
+    if os.path.exists(args.database):
+        return
+    print(f'Создаю и наполняю {args.database}...', file=sys.stderr)
+    call_command('migrate', verbosity=0)
+    call_command('seed_yatube', users=args.users, posts=args.posts,
+                 comments=args.comments, follows=args.follows, seed=1,
+                 stdout=sys.stderr)
+
+
+def scenarios():
+    """{вьюха: (метод, url, данные)} на самых нагруженных объектах."""
+    author = AuthorStats.objects.order_by('-followers_count').first().user
+    group = Group.objects.annotate(
+        total=Count('posts')).order_by('-total').first()
+    post = Post.objects.filter(author=author).order_by('-pub_date').first()
+    profile_args = [author.username]
+    post_args = [author.username, post.id]
+    return {
+        'index': ('get', reverse('posts:index'), None),
+        'group_posts': ('get', reverse('posts:group', args=[group.slug]),
+                        None),
+        'profile': ('get', reverse('posts:profile', args=profile_args),
+                    None),
+        'post_view': ('get', reverse('posts:post', args=post_args), None),
+        'follow_index': ('get', reverse('posts:follow_index'), None),
+        'new_post': ('post', reverse('posts:new_post'),
+                     {'text': 'Пост из бенчмарка'}),
+        'add_comment': ('post', reverse('posts:add_comment', args=post_args),
+                        {'text': 'Комментарий из бенчмарка'}),
+    }
+
+
+def reader():
+    """Пользователь с самым большим числом подписок."""
+    return AuthorStats.objects.order_by('-following_count').first().user
+
+
+@contextmanager
+def rolled_back(method):
+    if method == 'get':
+        yield
+        return
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def request(client, method, url, data, cold):
+    """Один запрос: (секунды, число запросов к базе)."""
+    if cold:
+        cache.clear()
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with rolled_back(method), connection.execute_wrapper(count):
+        started = time.perf_counter()
+        response = getattr(client, method)(url, data)
+        elapsed = time.perf_counter() - started
+    if response.status_code >= 400:
+        raise RuntimeError(f'{method.upper()} {url}: {response.status_code}')
+    return elapsed, len(queries)
+
+
+def allocated(client, method, url, data, cold, times):
+    """Медиана пика памяти, выделенной за запрос, в байтах."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(times):
+            if cold:
+                cache.clear()
+            with rolled_back(method):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                getattr(client, method)(url, data)
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return int(statistics.median(peaks))
+
+
+def measure(client, method, url, data, args):
+    for _ in range(args.warmup):
+        request(client, method, url, data, args.cold)
+    timings, queries = [], []
+    for _ in range(args.requests):
+        elapsed, count = request(client, method, url, data, args.cold)
+        timings.append(elapsed * 1000)
+        queries.append(count)
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return {
+        'p50_ms': round(cuts[49], 3),
+        'p95_ms': round(cuts[94], 3),
+        'p99_ms': round(cuts[98], 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': int(statistics.median(queries)),
+        'allocated_bytes': allocated(client, method, url, data, args.cold,
+                                     args.alloc_requests),
+    }
+
+
+def compare(results, baseline, metric, threshold):
+    """Вьюхи, которые стали медленнее threshold или делают больше запросов."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        ratio = current[metric] / before[metric] if before[metric] else 1
+        if ratio > threshold:
+            regressions.append(
+                f'{name}: {metric} {before[metric]} -> {current[metric]} '
+                f'(x{ratio:.2f})')
+        if current['queries'] > before['queries']:
+            regressions.append(
+                f'{name}: запросов {before["queries"]} -> '
+                f'{current["queries"]}')
+    return regressions
+
+
+def report(results, baseline, metric):
+    print(f'{"view":<14} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+          f'{"queries":>8} {"alloc KiB":>10} {"vs base":>8}')
+    for name, row in results.items():
+        before = baseline.get(name)
+        delta = ''
+        if before and before[metric]:
+            delta = f'x{row[metric] / before[metric]:.2f}'
+        print(f'{name:<14} {row["p50_ms"]:>9.2f} {row["p95_ms"]:>9.2f} '
+              f'{row["p99_ms"]:>9.2f} {row["queries"]:>8} '
+              f'{row["allocated_bytes"] / 1024:>10.1f} {delta:>8}')
+
+
+def main(args):
+    prepare_database(args)
+    client = Client()
+    client.force_login(reader())
+    selected = scenarios()
+    if args.views:
+        selected = {name: selected[name] for name in args.views}
+    results = {}
+    with override_settings(DEBUG=False):
+        for name, (method, url, data) in selected.items():
+            results[name] = measure(client, method, url, data, args)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)['views']
+    report(results, baseline, args.metric)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({
+                'meta': {
+                    'database': args.database,
+                    'requests': args.requests,
+                    'cold': args.cold,
+                    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                },
+                'views': results,
+            }, file, ensure_ascii=False, indent=2)
+    regressions = compare(results, baseline, args.metric, args.threshold)
+    for line in regressions:
+        print(f'РЕГРЕССИЯ {line}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(ARGS))
@@ -0,0 +1,156 @@
+"""JSON API только для чтения: /api/v1/.
+
+Строки читаются через values() и сериализуются как есть, без создания
+объектов моделей. Параметр fields= оставляет в SELECT только нужные
+колонки (и JOIN только для нужных связей); ключ курсора добавляется к ним
+всегда и в ответ не попадает, если его не просили. Страницы идут по
+курсору, как в HTML-лентах: next и previous — готовые ссылки.
+"""
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .models import Comment, Group, Post
+from .paginator import CommentPaginator, CursorPaginator
+from .transfer import Encoder
+
+User = get_user_model()
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Поле ответа -> колонка для values().
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+def _image_url(name):
+    return default_storage.url(name) if name else None
+
+
+CONVERTERS = {'image': _image_url}
+
+
+class RowsMixin:
+    """Ключ курсора из словаря values(), а не из атрибутов объекта."""
+
+    def cursor_key(self, row):
+        date_field, id_field = self.key_fields
+        return row[date_field].isoformat(), row[id_field]
+
+
+class PostRowsPaginator(RowsMixin, CursorPaginator):
+    pass
+
+
+class CommentRowsPaginator(RowsMixin, CommentPaginator):
+    pass
+
+
+def _error(message, status):
+    return JsonResponse({'detail': message}, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def _requested_fields(request, available):
+    """Список полей из ?fields=a,b; ValueError с неизвестными."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(available)
+    fields = list(dict.fromkeys(
+        name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise ValueError(', '.join(unknown))
+    return fields
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        return PAGE_SIZE
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def _link(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'?{params.urlencode()}')
+
+
+def _serialize(row, fields, available):
+    result = {}
+    for name in fields:
+        value = row[available[name]]
+        convert = CONVERTERS.get(name)
+        result[name] = convert(value) if convert else value
+    return result
+
+
+def _respond(request, queryset, available, paginator_class):
+    try:
+        fields = _requested_fields(request, available)
+    except ValueError as error:
+        return _error(f'Неизвестные поля: {error}', 400)
+    columns = {available[name] for name in fields}
+    columns.update(paginator_class.key_fields)
+    rows = queryset.values(*columns)
+    page = paginator_class(rows, _page_size(request)).get_cursor_page(
+        request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [_serialize(row, fields, available) for row in page],
+        'next': _link(request, page.next_cursor),
+        'previous': _link(request, page.previous_cursor),
+    }, encoder=Encoder, json_dumps_params={'ensure_ascii': False})
+
+
+@require_GET
+def posts(request):
+    return _respond(request, Post.objects.all(), POST_FIELDS,
+                    PostRowsPaginator)
+
+
+@require_GET
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True).first()
+    if group_id is None:
+        return _error('Группа не найдена', 404)
+    return _respond(request, Post.objects.filter(group=group_id),
+                    POST_FIELDS, PostRowsPaginator)
+
+
+@require_GET
+def user_posts(request, username):
+    user_id = User.objects.filter(username=username).values_list(
+        'id', flat=True).first()
+    if user_id is None:
+        return _error('Пользователь не найден', 404)
+    return _respond(request, Post.objects.filter(author=user_id),
+                    POST_FIELDS, PostRowsPaginator)
+
+
+@require_GET
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return _error('Пост не найден', 404)
+    return _respond(request, Comment.objects.filter(post=post_id),
+                    COMMENT_FIELDS, CommentRowsPaginator)
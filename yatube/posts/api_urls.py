@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+urlpatterns = [
+    path('posts/', api.posts, name='posts'),
+    path('posts/<int:post_id>/comments/', api.post_comments,
+         name='post_comments'),
+    path('groups/<slug:slug>/posts/', api.group_posts, name='group_posts'),
+    path('users/<str:username>/posts/', api.user_posts, name='user_posts'),
+]
@@ -0,0 +1,92 @@
+"""Архив автора: его посты, комментарии и картинки одним потоком.
+
+Генераторы отдают архив кусками для StreamingHttpResponse. Посты и
+комментарии читаются из базы порциями через iterator(), картинки — из
+хранилища блоками по CHUNK_SIZE, а zip пишется в поток без перемотки
+(с дескрипторами данных), поэтому память воркера не зависит от размера
+архива: в ней остаются лишь заголовки записей zip.
+"""
+import logging
+import zipfile
+
+from django.core.files.storage import default_storage
+
+from . import transfer
+from .models import Comment, Post
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Sink:
+    """Файл только на запись: копит байты до следующей выдачи."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _querysets(user):
+    return {
+        'post': Post.objects.filter(author=user),
+        'comment': Comment.objects.filter(author=user),
+    }
+
+
+def ndjson_stream(user, chunk_size=500):
+    """Посты и комментарии строками NDJSON с полем model."""
+    for name, queryset in _querysets(user).items():
+        for row in transfer.rows(name, queryset, chunk_size):
+            yield transfer.encode({'model': name, **row}).encode()
+
+
+def zip_stream(user, chunk_size=500):
+    """Zip: post.ndjson, comment.ndjson и images/<имя картинки>."""
+    return (chunk for chunk in _zip_chunks(user, chunk_size) if chunk)
+
+
+def _zip_chunks(user, chunk_size):
+    sink = _Sink()
+    querysets = _querysets(user)
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, queryset in querysets.items():
+            path = f'{name}.ndjson'
+            with archive.open(path, 'w', force_zip64=True) as entry:
+                for row in transfer.rows(name, queryset, chunk_size):
+                    entry.write(transfer.encode(row).encode())
+                    if len(sink.chunks) > 16:
+                        yield sink.drain()
+            yield sink.drain()
+        images = querysets['post'].exclude(image='').exclude(
+            image__isnull=True).order_by('image').values_list(
+                'image', flat=True).distinct()
+        for image in images.iterator(chunk_size=chunk_size):
+            yield from _write_image(archive, sink, image)
+    yield sink.drain()
+
+
+def _write_image(archive, sink, name):
+    try:
+        source = default_storage.open(name)
+    except OSError:
+        logger.warning('Картинка %s не найдена, пропускаю', name)
+        return
+    info = zipfile.ZipInfo(f'images/{name}')
+    info.compress_type = zipfile.ZIP_STORED
+    with source, archive.open(info, 'w', force_zip64=True) as entry:
+        for chunk in source.chunks(CHUNK_SIZE):
+            entry.write(chunk)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,93 @@
+"""Async-версии страниц чтения для запуска под ASGI (yatube/asgi.py).
+
+Запросы к базе идут через async API querysets Django 4.1, поэтому
+медленный запрос не занимает поток воркера. Отрисовка общая с views.py и
+выполняется в потоке: шаблоны лениво читают миниатюры и кэш фрагментов,
+а это синхронный код.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+
+from . import follow_graph, views
+from .models import Group, Post
+from .page_cache import cache_anonymous_page
+from .paginator import aget_page
+from .timeline import TimelinePaginator
+
+User = get_user_model()
+
+
+async def auser(request):
+    """request.user, загруженный в потоке (request.auser() — с Django 5.0)."""
+    def load():
+        request.user.is_authenticated
+        return request.user
+
+    return await sync_to_async(load)()
+
+
+def login_required(view):
+    """login_required из Django 4.1 не умеет async-вьюхи."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await auser(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(
+            f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+@cache_anonymous_page('index')
+async def index(request):
+    page = await aget_page(request, views.feed(Post.objects))
+    return await sync_to_async(views.render_index)(request, page)
+
+
+@cache_anonymous_page('group:{slug}')
+async def group_posts(request, slug):
+    group = await aget_object_or_404(Group.objects, slug=slug)
+    page = await aget_page(request, views.feed(group.posts))
+    return await sync_to_async(views.render_group)(request, group, page)
+
+
+@cache_anonymous_page('user:{username}')
+async def profile(request, username):
+    user = await auser(request)
+    author = await aget_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    following = await sync_to_async(follow_graph.follows)(user.id, author.id)
+    page = await aget_page(request, views.feed(author.posts))
+    return await sync_to_async(views.render_profile)(
+        request, author, following, page)
+
+
+@cache_anonymous_page('user:{username}', 'post:{post_id}')
+async def post_view(request, username, post_id):
+    post = await aget_object_or_404(
+        Post.objects.select_related('author__stats'),
+        author__username=username, id=post_id)
+    comments = await views.comment_paginator(post_id).aget_cursor_page(
+        request.GET.get('cursor'))
+    return await sync_to_async(views.render_post)(request, post, comments)
+
+
+@login_required
+async def follow_index(request):
+    user = await auser(request)
+    # Конструктор читает подписки и «звёзд» из кэша (и базы при промахе).
+    paginator = await sync_to_async(TimelinePaginator)(
+        user, views.POSTS_PER_PAGE)
+    page = await aget_page(request, paginator)
+    return await sync_to_async(views.render_follow)(request, page)
@@ -0,0 +1,97 @@
+"""Кэш фрагментов лент с инвалидацией по поколениям.
+
+У каждой области (лента index, группа, профиль автора) есть счётчик
+поколения. Сигналы Post и Group увеличивают его, и все фрагменты области,
+записанные с прежним поколением, становятся устаревшими. Устаревший
+фрагмент перерисовывает только один запрос, остальные в это время получают
+старое содержимое.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+
+KEY_PREFIX = 'feedcache'
+
+
+def scope_of(obj):
+    """Область для модели ('group:3', 'user:5') или строки ('index')."""
+    if isinstance(obj, models.Model):
+        return f'{obj._meta.model_name}:{obj.pk}'
+    return str(obj)
+
+
+def generation_key(scope):
+    return f'{KEY_PREFIX}:gen:{scope}'
+
+
+def fragment_key(scope, vary_on):
+    digest = hashlib.md5(
+        ':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{scope}:{digest}'
+
+
+def _bump_now(scopes):
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Счётчик вытеснен или ещё не создан: начинаем с текущего времени
+            # в мс, чтобы не совпасть с поколениями уже записанных фрагментов.
+            cache.add(key, time.time_ns() // 1_000_000, None)
+
+
+def bump(*scopes):
+    """Делает фрагменты областей устаревшими.
+
+    Поколение растёт сразу и ещё раз после коммита: иначе запрос, успевший
+    перерисовать фрагмент по данным до коммита, закэшировал бы их под новым
+    поколением.
+    """
+    _bump_now(scopes)
+    transaction.on_commit(lambda: _bump_now(scopes))
+
+
+def generations(*scopes):
+    """Текущие поколения областей; недостающие счётчики создаются."""
+    keys = [generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [scope for scope, key in zip(scopes, keys) if key not in found]
+    if missing:
+        _bump_now(missing)
+        found.update(cache.get_many(
+            [generation_key(scope) for scope in missing]))
+    return tuple(found.get(key) for key in keys)
+
+
+def render(scope, vary_on, render_fragment):
+    """Фрагмент из кэша или результат render_fragment() для устаревшего.
+
+    Свежий фрагмент отдаётся как есть. Устаревший перерисовывает тот, кто
+    взял блокировку; остальные получают старую версию.
+    """
+    gen_key, key = generation_key(scope), fragment_key(scope, vary_on)
+    lock_key = f'{key}:lock'
+    found = cache.get_many([gen_key, key])
+    generation = found.get(gen_key)
+    if generation is None:
+        _bump_now([scope])
+        generation = cache.get(gen_key)
+    cached = found.get(key)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    refresher = cache.add(lock_key, 1, settings.FEED_CACHE_LOCK_TIMEOUT)
+    if not refresher and cached is not None:
+        return cached[1]
+    if not refresher:
+        return render_fragment()
+    try:
+        content = render_fragment()
+        cache.set(key, (generation, content), settings.FEED_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return content
@@ -0,0 +1,91 @@
+"""Кэш подписок пользователя: отсортированный массив id авторов.
+
+Список тех, на кого подписан пользователь, хранится в общем кэше одним
+значением — байтами array('i'), по 4 байта на подписку, вместе с
+поколением, при котором он прочитан. Проверка «подписан ли U на A» —
+двоичный поиск в нём, проверка сразу многих авторов — один проход.
+Сигналы Follow увеличивают поколение (сейчас и после коммита, как
+feed_cache.bump): список, загруженный до изменения, даже записанный
+после него, уже не совпадёт с поколением и будет прочитан заново.
+"""
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+KEY_PREFIX = 'followees'
+TYPECODE = 'i'
+
+
+def cache_key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def generation_key(user_id):
+    return f'{KEY_PREFIX}:gen:{user_id}'
+
+
+def _bump_now(user_id):
+    key = generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Как в feed_cache: новый счётчик не совпадёт со старыми записями.
+        cache.add(key, time.time_ns() // 1_000_000, None)
+
+
+def _generation(user_id, found):
+    generation = found.get(generation_key(user_id))
+    if generation is None:
+        _bump_now(user_id)
+        generation = cache.get(generation_key(user_id))
+    return generation
+
+
+def followees(user_id):
+    """Отсортированный array id авторов, на которых подписан user_id."""
+    ids = array(TYPECODE)
+    if user_id is None:
+        return ids
+    key = cache_key(user_id)
+    found = cache.get_many([generation_key(user_id), key])
+    generation = _generation(user_id, found)
+    cached = found.get(key)
+    if cached is not None and cached[0] == generation:
+        ids.frombytes(cached[1])
+        return ids
+    ids.extend(Follow.objects.filter(user_id=user_id)
+               .order_by('author_id')
+               .values_list('author_id', flat=True))
+    cache.set(key, (generation, ids.tobytes()),
+              settings.FOLLOWEES_CACHE_TIMEOUT)
+    return ids
+
+
+def _contains(ids, author_id):
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def follows(user_id, author_id):
+    """Подписан ли user_id на author_id."""
+    return _contains(followees(user_id), author_id)
+
+
+def follows_many(user_id, author_ids):
+    """Множество тех из author_ids, на кого подписан user_id."""
+    ids = followees(user_id)
+    if not ids:
+        return set()
+    return {author_id for author_id in author_ids
+            if _contains(ids, author_id)}
+
+
+def invalidate(user_id):
+    _bump_now(user_id)
+    transaction.on_commit(lambda: _bump_now(user_id))
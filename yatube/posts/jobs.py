@@ -0,0 +1,228 @@
+"""Очередь фоновых задач в основной базе, без внешнего брокера.
+
+enqueue() пишет задачу строкой Job в текущей транзакции. Пишущие вьюхи
+обёрнуты в transaction.atomic, и задачи из их сигналов коммитятся вместе с
+данными: откат отменяет и задачу, а воркер не увидит её до коммита. Вне
+atomic() (shell, команды) задача коммитится сразу отдельно от данных. Команда
+run_workers забирает готовые задачи порциями и выполняет их в пуле
+процессов. Забор — один UPDATE с условием на run_after и меткой claimed_by,
+поэтому два воркера не возьмут одну задачу. Забранная задача арендуется
+на visibility_timeout секунд: если воркер умер, после аренды её возьмёт
+другой. Ошибка возвращает задачу в очередь с экспоненциальной задержкой,
+после max_attempts попыток задача остаётся со статусом failed.
+
+Доставка «хотя бы один раз»: задачи должны быть идемпотентными. Без
+JOBS_ASYNC (режим разработки и тесты) enqueue() выполняет задачу сразу.
+"""
+import logging
+import time
+import traceback
+import uuid
+from concurrent.futures import (FIRST_COMPLETED, Future, ProcessPoolExecutor,
+                                wait)
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+from importlib import import_module
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import worker
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(func):
+    """Регистрирует функцию задачей очереди под именем «модуль.функция»."""
+    TASKS[_name(func)] = func
+    return func
+
+
+def _name(func):
+    return f'{func.__module__}.{func.__name__}'
+
+
+def enqueue(func, *args, delay=0, max_attempts=None):
+    """Ставит func(*args) в очередь; аргументы должны сериализоваться в JSON.
+
+    Возвращает Job или None, если задача выполнена сразу (без JOBS_ASYNC).
+    """
+    name = _name(func)
+    if TASKS.get(name) is not func:
+        raise ValueError(f'{name} не зарегистрирована через @jobs.task')
+    if not settings.JOBS_ASYNC:
+        func(*args)
+        return None
+    return Job.objects.create(
+        task=name, args=list(args),
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS)
+
+
+def backoff(attempts):
+    """Задержка перед следующей попыткой в секундах."""
+    return min(settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1),
+               settings.JOBS_RETRY_BACKOFF_MAX)
+
+
+def claim(limit, visibility_timeout):
+    """Забирает до limit готовых задач в аренду; возвращает их список."""
+    now = timezone.now()
+    ready = Job.objects.filter(
+        status__in=(Job.QUEUED, Job.RUNNING), run_after__lte=now)
+    # Аренда истекла на последней попытке: воркер, скорее всего, падает на
+    # этой задаче, и брать её снова незачем.
+    ready.filter(status=Job.RUNNING, attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, last_error='Истекла аренда последней попытки')
+    ids = list(ready.order_by('run_after', 'id').values_list(
+        'id', flat=True)[:limit])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    # Условие на run_after повторяется в UPDATE: задачу, которую между
+    # SELECT и UPDATE забрал другой воркер, этот не перезапишет.
+    ready.filter(id__in=ids).update(
+        status=Job.RUNNING, claimed_by=token, attempts=F('attempts') + 1,
+        run_after=now + timedelta(seconds=visibility_timeout))
+    return list(Job.objects.filter(claimed_by=token, status=Job.RUNNING))
+
+
+def complete(job):
+    Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by).delete()
+
+
+def fail(job, error):
+    """Возвращает задачу в очередь с задержкой или помечает failed."""
+    owned = Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by)
+    if job.attempts >= job.max_attempts:
+        owned.update(status=Job.FAILED, last_error=error)
+        return
+    owned.update(
+        status=Job.QUEUED, last_error=error,
+        run_after=timezone.now() + timedelta(seconds=backoff(job.attempts)))
+
+
+def execute(name, args):
+    """Выполняет задачу; возвращает текст ошибки или None при успехе."""
+    try:
+        module, _ = name.rsplit('.', 1)
+        import_module(module)
+        TASKS[name](*args)
+    except Exception:
+        logger.exception('Задача %s%s завершилась ошибкой', name, tuple(args))
+        return traceback.format_exc()
+    return None
+
+
+def work(processes=None, batch_size=None, visibility_timeout=None,
+         poll_interval=1.0, once=False, should_stop=lambda: False,
+         log=logger.info):
+    """Цикл воркера; возвращает (выполнено, ошибок).
+
+    Задачи забираются, пока в работе меньше двух на процесс. processes=0
+    выполняет их в текущем процессе. С once цикл заканчивается, когда
+    очередь пуста.
+    """
+    processes = settings.JOBS_WORKERS if processes is None else processes
+    totals = _Totals(log)
+    take = partial(
+        claim, visibility_timeout=(
+            visibility_timeout or settings.JOBS_VISIBILITY_TIMEOUT))
+    batch_size = batch_size or settings.JOBS_BATCH_SIZE
+    if processes:
+        _work_in_pool(processes, take, batch_size, poll_interval, once,
+                      should_stop, totals)
+    else:
+        _work_here(take, batch_size, poll_interval, once, should_stop, totals)
+    return totals.done, totals.failed
+
+
+class _Totals:
+    def __init__(self, log):
+        self.log, self.done, self.failed = log, 0, 0
+
+    def finish(self, job, error):
+        if error is None:
+            complete(job)
+            self.done += 1
+            return
+        fail(job, error)
+        self.failed += 1
+        self.log(f'{job}: попытка {job.attempts} из {job.max_attempts} '
+                 f'не удалась')
+
+
+def _work_here(take, batch_size, poll_interval, once, should_stop, totals):
+    while not should_stop():
+        batch = take(batch_size)
+        if not batch:
+            if once:
+                return
+            time.sleep(poll_interval)
+        for job in batch:
+            totals.finish(job, execute(job.task, job.args))
+
+
+def _pool(processes):
+    return ProcessPoolExecutor(
+        max_workers=processes, mp_context=get_context('spawn'),
+        initializer=worker.init)
+
+
+def _submit(pool, job):
+    try:
+        return pool.submit(worker.execute, job.task, job.args)
+    except BrokenProcessPool as error:
+        future = Future()
+        future.set_exception(error)
+        return future
+
+
+def _finish(futures, running, totals):
+    """Учитывает завершённые задачи; возвращает True, если пул сломан."""
+    broken = False
+    for future in futures:
+        job = running.pop(future)
+        try:
+            error = future.result()
+        except Exception as exc:
+            # Процесс пула умер (BrokenProcessPool) или результат не удалось
+            # передать: задача возвращается в очередь как упавшая.
+            logger.error('Задача %s не выполнена в пуле', job, exc_info=exc)
+            broken = broken or isinstance(exc, BrokenProcessPool)
+            error = ''.join(traceback.format_exception(exc))
+        totals.finish(job, error)
+    return broken
+
+
+def _work_in_pool(processes, take, batch_size, poll_interval, once,
+                  should_stop, totals):
+    capacity = processes * 2
+    running = {}
+    pool = _pool(processes)
+    try:
+        while True:
+            free = capacity - len(running)
+            if free and not should_stop():
+                for job in take(min(free, batch_size)):
+                    running[_submit(pool, job)] = job
+            if not running:
+                if once or should_stop():
+                    return
+                time.sleep(poll_interval)
+                continue
+            finished, _ = wait(running, timeout=poll_interval,
+                               return_when=FIRST_COMPLETED)
+            if _finish(finished, running, totals):
+                # Сломанный пул завершает с ошибкой и остальные задачи.
+                _finish(list(running), running, totals)
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = _pool(processes)
+    finally:
+        pool.shutdown()
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в NDJSON, '
+            'по файлу на модель')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--models', nargs='+', choices=transfer.MODELS,
+                            default=list(transfer.MODELS))
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = transfer.export_all(
+            options['directory'], options['models'],
+            chunk_size=options['chunk_size'], log=self.stdout.write)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено объектов: {total} за {elapsed:.1f} с '
+            f'({total / elapsed if elapsed else 0:.0f} в секунду)'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails, worker
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для картинок уже опубликованных постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--chunk-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').exclude(
+            image__isnull=True).values_list('image', flat=True)
+        started = time.monotonic()
+        done = created = 0
+        with thumbnails.pool(options['workers']) as pool:
+            for count in pool.map(
+                    worker.generate_thumbnails,
+                    images.iterator(chunk_size=options['chunk_size']),
+                    chunksize=options['chunk_size']):
+                done += 1
+                created += count
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}, миниатюр: {created}, '
+            f'за {time.monotonic() - started:.1f} с'))
@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Загружает данные, выгруженные export_ndjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--models', nargs='+', choices=transfer.MODELS,
+                            default=None)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Потоков на этап; на SQLite модели грузятся по очереди')
+        parser.add_argument('--ignore-conflicts', action='store_true')
+        parser.add_argument('--skip-timelines', action='store_true')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        names = options['models'] or [
+            name for name in transfer.MODELS
+            if os.path.exists(transfer.path_for(directory, name))]
+        missing = [name for name in names
+                   if not os.path.exists(transfer.path_for(directory, name))]
+        if missing or not names:
+            raise CommandError(
+                f'Нет файлов для моделей: {", ".join(missing) or "все"}')
+        started = time.monotonic()
+        total = transfer.import_all(
+            directory, names, chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            ignore_conflicts=options['ignore_conflicts'],
+            timelines=not options['skip_timelines'],
+            log=self.stdout.write)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено объектов: {total}, всего {elapsed:.1f} с'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики комментариев постов и чинит расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        repaired = stats.reconcile_comment_counts(
+            chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлены счётчики комментариев {repaired} постов'))
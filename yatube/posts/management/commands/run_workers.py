@@ -0,0 +1,34 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from posts import jobs
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None,
+                            help='0 — выполнять в текущем процессе')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--visibility-timeout', type=int, default=None)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true',
+                            help='Выйти, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        stopping = []
+        # SIGTERM: новые задачи не брать, начатые — доделать.
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        done, failed = jobs.work(
+            processes=options['processes'],
+            batch_size=options['batch_size'],
+            visibility_timeout=options['visibility_timeout'],
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+            should_stop=lambda: bool(stopping),
+            log=self.stderr.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {done}, с ошибкой: {failed}'))
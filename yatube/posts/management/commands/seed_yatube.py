@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.seed import Seeder
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу синтетическими пользователями, постами, '
+            'комментариями и подписками')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного закона популярности')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--prefix', default='seed')
+        parser.add_argument('--password', default='yatube')
+        parser.add_argument(
+            '--images', type=float, default=0.0,
+            help='Доля постов с картинкой, от 0 до 1')
+        parser.add_argument('--image-pool', type=int, default=20)
+        parser.add_argument('--skip-timelines', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        seeder = Seeder(
+            seed=options['seed'], chunk_size=options['chunk_size'],
+            alpha=options['alpha'], days=options['days'],
+            prefix=options['prefix'], password=options['password'],
+            log=self.stdout.write)
+        users = seeder.users(options['users'])
+        groups = seeder.groups(options['groups'])
+        images = []
+        if options['images'] > 0:
+            images = seeder.images(options['image_pool'])
+        posts = seeder.posts(options['posts'], users, groups, images,
+                             options['images'])
+        if posts:
+            seeder.comments(options['comments'], posts, users)
+        follows = seeder.follows(options['follows'], users)
+        seeder.finish(follows, timelines=not options['skip_timelines'])
+        self.stdout.write(self.style.SUCCESS('Готово'))
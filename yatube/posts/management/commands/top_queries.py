@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from yatube import query_log
+
+
+class Command(BaseCommand):
+    help = ('Самые тяжёлые запросы к базе по отпечаткам SQL: сумма '
+            'сохранённых агрегатов всех воркеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--order', choices=query_log.ORDERS,
+                            default='total')
+        parser.add_argument('--per-view', action='store_true',
+                            help='Отдельная строка на каждый маршрут')
+        parser.add_argument('--view', help='Только этот маршрут')
+        parser.add_argument('--width', type=int, default=160,
+                            help='Обрезать SQL до стольких символов')
+
+    def handle(self, *args, **options):
+        rows = query_log.top(
+            query_log.collect(), limit=options['limit'],
+            order=options['order'], per_view=options['per_view'],
+            view=options['view'])
+        if not rows:
+            self.stdout.write(f'Нет данных в {query_log.directory()}')
+            return
+        self.stdout.write(f'{"total ms":>10} {"count":>8} {"mean ms":>8} '
+                          f'{"max ms":>8}  маршруты / SQL')
+        for sql, views, values in rows:
+            count, total, longest = values
+            self.stdout.write(
+                f'{total * 1000:>10.1f} {count:>8} '
+                f'{total / count * 1000:>8.2f} {longest * 1000:>8.2f}  '
+                f'{", ".join(views)}')
+            self.stdout.write(f'{"":>38}  {sql[:options["width"]]}')
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# Бесконтентная таблица FTS5: хранит только индекс, текст берётся из
+# posts_post. Буква «ё» приводится к «е» и в индексе, и в запросе.
+NORMALIZE = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+    "text, content='', tokenize='unicode61 remove_diacritics 2', "
+    "prefix='2 3')",
+    "CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts (rowid, text) "
+    f"VALUES (NEW.id, {NORMALIZE.format('NEW.text')}); END",
+    "CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts (posts_post_fts, rowid, text) "
+    f"VALUES ('delete', OLD.id, {NORMALIZE.format('OLD.text')}); END",
+    "CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF text ON posts_post "
+    "BEGIN "
+    "INSERT INTO posts_post_fts (posts_post_fts, rowid, text) "
+    f"VALUES ('delete', OLD.id, {NORMALIZE.format('OLD.text')}); "
+    "INSERT INTO posts_post_fts (rowid, text) "
+    f"VALUES (NEW.id, {NORMALIZE.format('NEW.text')}); END",
+    "INSERT INTO posts_post_fts (rowid, text) "
+    f"SELECT id, {NORMALIZE.format('text')} FROM posts_post",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_authorstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL),
+                             run_on_sqlite(DROP_SQL)),
+    ]
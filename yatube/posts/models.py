@@ -21,9 +21,11 @@ class Post(models.Model):
                                     )
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
-                               related_name='posts')
+                               related_name='posts',
+                               db_index=False)
     group = models.ForeignKey(Group,
                               on_delete=models.SET_NULL,
+                              db_index=False,
                               related_name='posts',
                               blank=True,
                               null=True,
@@ -34,9 +36,22 @@ class Post(models.Model):
                               null=True,
                               verbose_name='Добавьте изображение',
                               help_text='Здесь можно добавить изображение')
+    # Ведётся сигналами Comment (posts/signals.py), сверяется командой
+    # reconcile_comment_counts.
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты читаются как filter(...).order_by('-pub_date', '-id'):
+        # составной индекс отдаёт страницу без сортировки во временном
+        # B-дереве и заменяет одиночные индексы внешних ключей.
+        indexes = (
+            models.Index(fields=['-pub_date', '-id'], name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -44,7 +59,8 @@ class Post(models.Model):
 
 class Comment(models.Model):
     post = models.ForeignKey(
-        Post, on_delete=models.CASCADE, related_name='comments')
+        Post, on_delete=models.CASCADE, related_name='comments',
+        db_index=False)
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='comments'
     )
@@ -58,16 +74,136 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ["-created"]
+        indexes = (
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        )
 
 
 class Follow(models.Model):
     user = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name='follower'
+        User, on_delete=models.CASCADE, related_name='follower',
+        db_index=False
     )
     author = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name='following'
+        User, on_delete=models.CASCADE, related_name='following',
+        db_index=False
     )
 
     class Meta:
+        # Уникальный индекс (user, author) обслуживает проверки подписки,
+        # (author, user) — выборку подписчиков автора без чтения таблицы.
         constraints = (models.UniqueConstraint(fields=['user', 'author'],
                                                name='author_constraint'),)
+        indexes = (
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        )
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписчика, разложенный при публикации (fan-out).
+
+    pub_date и author копируются из поста, чтобы лента читалась одним
+    диапазоном по индексу (user, pub_date) без соединения с Follow.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        constraints = (models.UniqueConstraint(fields=['user', 'post'],
+                                               name='timeline_constraint'),)
+        indexes = (
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        )
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора для боковой панели профиля.
+
+    Обновляются сигналами вместе с Post и Follow, пересчитываются командой
+    rebuild_author_stats.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0, db_index=True)
+    following_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.user)
+
+
+class Suggestion(models.Model):
+    """Автор, которого пользователю стоит прочитать («Кого читать»).
+
+    score — сколько авторов из подписок пользователя подписаны на author.
+    Таблицу целиком пересчитывает команда compute_suggestions
+    (posts/suggestions.py), вьюхи читают её по индексу (user, -score).
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='suggestions'
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+'
+    )
+    score = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['-score', 'author']
+        indexes = (
+            models.Index(fields=['user', '-score', 'author'],
+                         name='suggestion_user_score_idx'),
+        )
+
+
+class Job(models.Model):
+    """Задача фоновой очереди (posts/jobs.py), её выполняет run_workers.
+
+    run_after — когда задачу можно брать: для поставленной в очередь это
+    время следующей попытки, для выполняемой — конец аренды, после которого
+    задачу заберёт другой воркер. Успешные задачи удаляются.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField()
+    claimed_by = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = (
+            models.Index(fields=['status', 'run_after'],
+                         name='job_status_run_after_idx'),
+            models.Index(fields=['claimed_by'], name='job_claimed_by_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.task}{tuple(self.args)}'
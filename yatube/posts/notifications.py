@@ -0,0 +1,25 @@
+"""Письма пользователям; отправляются фоновыми задачами (posts/jobs.py)."""
+from django.conf import settings
+from django.core.mail import send_mail
+from django.urls import reverse
+
+from . import jobs
+from .models import Comment
+
+
+@jobs.task
+def comment_notification(comment_id):
+    """Сообщает автору поста о новом комментарии."""
+    comment = Comment.objects.select_related(
+        'author', 'post__author').filter(pk=comment_id).first()
+    if comment is None:
+        return
+    recipient = comment.post.author
+    if not recipient.email or recipient == comment.author:
+        return
+    url = settings.SITE_URL.rstrip('/') + reverse(
+        'posts:post', args=[recipient.username, comment.post_id])
+    send_mail(
+        f'Новый комментарий от {comment.author.username}',
+        f'{comment.text}\n\n{url}#comment_{comment.pk}',
+        settings.DEFAULT_FROM_EMAIL, [recipient.email])
@@ -0,0 +1,111 @@
+"""Кэш целых страниц для анонимных читателей.
+
+Страница хранится вместе с поколениями своих областей (см. feed_cache):
+сигналы Post, Comment и Follow сдвигают поколения, и страница
+перерисовывается при следующем запросе. ETag строится из адреса и
+поколений, Last-Modified — время, когда страница попала в кэш: правка или
+удаление записи не двигают дату самой свежей записи, а новую версию
+страницы двигают. Повторный визит получает 304 без рендера и без запросов
+к базе.
+"""
+import asyncio
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import feed_cache
+
+KEY_PREFIX = 'pagecache'
+
+
+def page_scope(template, **kwargs):
+    """Область страницы: 'page:index', 'page:user:leo', 'page:post:7'."""
+    return 'page:' + template.format(**kwargs)
+
+
+def cache_anonymous_page(*scopes):
+    """Кэширует ответ вьюхи для анонимов.
+
+    scopes — шаблоны областей, в которые подставляются аргументы URL.
+    Подходит и для async-вьюх: работа с кэшем тогда идёт в потоке.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                response, etag, key = await sync_to_async(_lookup)(
+                    request, scopes, kwargs)
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                if etag is None:
+                    return response
+                return await sync_to_async(_store)(response, etag, key)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response, etag, key = _lookup(request, scopes, kwargs)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if etag is None:
+                return response
+            return _store(response, etag, key)
+        return wrapper
+    return decorator
+
+
+def _lookup(request, scopes, kwargs):
+    """(готовый ответ или None, etag, ключ); etag None — не кэшируем."""
+    if (request.method not in ('GET', 'HEAD')
+            or request.user.is_authenticated):
+        return None, None, None
+    generations = feed_cache.generations(
+        *(page_scope(scope, **kwargs) for scope in scopes))
+    path = request.get_full_path()
+    etag = '"{}"'.format(hashlib.md5(
+        f'{path}:{generations}'.encode()).hexdigest())
+    key = f'{KEY_PREFIX}:{hashlib.md5(path.encode()).hexdigest()}'
+    cached = cache.get(key)
+    if cached is not None and cached[0] == etag:
+        _, modified, content, content_type = cached
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified)
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+        return _with_validators(response, etag, modified), etag, key
+
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return _with_validators(response, etag, None), etag, key
+    return None, etag, key
+
+
+def _store(response, etag, key):
+    if response.status_code != 200 or response.cookies:
+        return response
+    modified = int(time.time())
+    previous = cache.get(key)
+    if previous is not None:
+        # Даты с точностью до секунды: новая версия, записанная в ту же
+        # секунду, что и прежняя, должна всё равно быть «новее» её.
+        modified = max(modified, previous[1] + 1)
+    cache.set(key, (etag, modified, response.content,
+                    response['Content-Type']),
+              settings.PAGE_CACHE_TIMEOUT)
+    return _with_validators(response, etag, modified)
+
+
+def _with_validators(response, etag, modified):
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    return response
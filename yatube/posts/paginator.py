@@ -0,0 +1,152 @@
+import base64
+import binascii
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, key):
+    """Упаковывает направление и ключ позиции в непрозрачный токен."""
+    raw = '|'.join([direction, *(str(value) for value in key)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (direction, [части ключа]) или None для битого токена."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    direction, *key = raw.split('|')
+    if direction not in (NEXT, PREVIOUS):
+        return None
+    return direction, key
+
+
+class CursorPaginator(Paginator):
+    """Паджинатор по ключу (pub_date, id) без OFFSET и COUNT(*).
+
+    Страница по курсору знает только о соседях: номер страницы равен 1,
+    если предыдущей нет, и 2 в противном случае, а num_pages выставляется
+    так, чтобы стандартные has_next/has_previous у Page работали как есть.
+    Старые ссылки вида ?page=N обслуживает обычный get_page().
+    """
+    key_fields = ('pub_date', 'id')
+
+    def __init__(self, object_list, per_page, **kwargs):
+        object_list = self.order(object_list)
+        super().__init__(object_list, per_page, **kwargs)
+
+    def get_cursor_page(self, cursor=None):
+        direction, key = self.position(cursor)
+        rows = self.fetch(direction, key)
+        if key is not None and not rows:
+            return self.get_cursor_page()
+        return self.build_page(direction, key, rows)
+
+    async def aget_cursor_page(self, cursor=None):
+        """То же для async-вьюх: окно читается через async ORM."""
+        direction, key = self.position(cursor)
+        rows = await self.afetch(direction, key)
+        if key is not None and not rows:
+            return await self.aget_cursor_page()
+        return self.build_page(direction, key, rows)
+
+    def position(self, cursor):
+        """(direction, key) из токена; битый токен — первая страница."""
+        position = decode_cursor(cursor) if cursor else None
+        if position is not None:
+            try:
+                return position[0], self.parse_key(position[1])
+            except (TypeError, ValueError):
+                pass
+        return NEXT, None
+
+    def build_page(self, direction, key, rows):
+        extra = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            has_previous, has_next = extra, True
+        else:
+            has_previous, has_next = key is not None, extra
+
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = (
+            encode_cursor(NEXT, self.cursor_key(rows[-1]))
+            if has_next and rows else None)
+        page.previous_cursor = (
+            encode_cursor(PREVIOUS, self.cursor_key(rows[0]))
+            if has_previous and rows else None)
+        return page
+
+    def cursor_key(self, obj):
+        """Ключ позиции записи для курсора."""
+        date_field, id_field = self.key_fields
+        return getattr(obj, date_field).isoformat(), getattr(obj, id_field)
+
+    def parse_key(self, values):
+        """Обратное к cursor_key(); ValueError для битого ключа."""
+        pub_date, pk = values
+        pub_date = parse_datetime(pub_date)
+        if pub_date is None:
+            raise ValueError(values)
+        return pub_date, int(pk)
+
+    def fetch(self, direction, key):
+        """Записи страницы плюс одна лишняя, чтобы узнать о соседе."""
+        return list(self.window(self.object_list, direction, key))
+
+    async def afetch(self, direction, key):
+        return [row async for row in self.window(
+            self.object_list, direction, key)]
+
+    def order(self, queryset, key_fields=None):
+        date_field, id_field = key_fields or self.key_fields
+        return queryset.order_by(f'-{date_field}', f'-{id_field}')
+
+    def window(self, queryset, direction, key, key_fields=None):
+        """Срез queryset после позиции key в направлении direction.
+
+        queryset должен быть упорядочен через order() с теми же полями.
+        Возвращает ленивый queryset: его читают fetch() и afetch().
+        """
+        date_field, id_field = key_fields or self.key_fields
+        if key is not None:
+            pub_date, pk = key
+            lookup = 'lt' if direction == NEXT else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__{lookup}': pub_date})
+                | Q(**{date_field: pub_date, f'{id_field}__{lookup}': pk}))
+        if direction == PREVIOUS:
+            queryset = queryset.reverse()
+        return queryset[:self.per_page + 1]
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии поста от новых к старым по ключу (created, id)."""
+    key_fields = ('created', 'id')
+
+
+def get_page(request, paginator):
+    """Страница: ?page=N по-старому, иначе по курсору."""
+    page_number = request.GET.get('page')
+    if page_number is not None and 'cursor' not in request.GET:
+        return paginator.get_page(page_number)
+    return paginator.get_cursor_page(request.GET.get('cursor'))
+
+
+async def aget_page(request, paginator):
+    """get_page() для async-вьюх; старые ?page=N считаются в потоке."""
+    page_number = request.GET.get('page')
+    if page_number is not None and 'cursor' not in request.GET:
+        return await sync_to_async(paginator.get_page)(page_number)
+    return await paginator.aget_cursor_page(request.GET.get('cursor'))
@@ -0,0 +1,224 @@
+"""Полнотекстовый поиск по постам на FTS5 SQLite.
+
+Индекс posts_post_fts создаёт миграция 0009, а триггеры на posts_post
+обновляют его при любом INSERT, UPDATE и DELETE, в том числе при
+bulk_create и QuerySet.update(), которые не шлют сигналов. SQLite
+пересоздаёт таблицу при изменении её схемы и теряет триггеры, поэтому после
+каждого migrate они восстанавливаются (install_triggers).
+Токенизатор unicode61 приводит к нижнему регистру и кириллицу, а вместо
+стемминга каждое слово запроса ищется как префикс: «котик» находит
+«котики» и «котиками». Результаты упорядочены по bm25.
+
+bm25 зависит от статистики всего индекса, и новый или удалённый пост
+сдвигает ранги остальных. Поэтому лучшие SEARCH_RESULTS_LIMIT id запроса
+ранжируются один раз на поколение области SCOPE (его увеличивают сигналы
+Post) и лежат в кэше; курсоры и ?page=N листают этот снимок по номеру
+позиции, и посты не повторяются и не пропадают.
+"""
+import hashlib
+import re
+from array import array
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+
+from . import feed_cache
+from .models import Post
+from .paginator import NEXT, CursorPaginator
+
+FTS_TABLE = 'posts_post_fts'
+NORMALIZE = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+TERM_RE = re.compile(r'\w+')
+
+_INDEX = (f'INSERT INTO {FTS_TABLE} (rowid, text) '
+          f"VALUES (NEW.id, {NORMALIZE.format('NEW.text')});")
+_UNINDEX = (f'INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text) '
+            f"VALUES ('delete', OLD.id, {NORMALIZE.format('OLD.text')});")
+TRIGGERS = {
+    f'{FTS_TABLE}_insert': f'AFTER INSERT ON posts_post BEGIN {_INDEX} END',
+    f'{FTS_TABLE}_delete': f'AFTER DELETE ON posts_post BEGIN {_UNINDEX} END',
+    f'{FTS_TABLE}_update': (
+        f'AFTER UPDATE OF text ON posts_post BEGIN {_UNINDEX} {_INDEX} END'),
+}
+
+MATCHING_IDS = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+RANKED = (
+    f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+    f'ORDER BY bm25({FTS_TABLE}), rowid LIMIT %s'
+)
+SCOPE = 'search'
+SNAPSHOT_PREFIX = 'search'
+TYPECODE = 'i'
+
+
+def match_expression(query):
+    """Запрос пользователя в выражение MATCH; '' если слов нет.
+
+    Слова берутся в кавычки, поэтому синтаксис FTS5 в запросе (NEAR, OR,
+    двоеточия) не интерпретируется.
+    """
+    query = query.replace('ё', 'е').replace('Ё', 'Е')
+    return ' '.join(f'"{term}"*' for term in TERM_RE.findall(query))
+
+
+def filter_posts(queryset, query):
+    """Посты queryset, подходящие под запрос, без сортировки по рангу."""
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(MATCHING_IDS, [match]))
+
+
+def ranked_ids(match, limit):
+    """array лучших limit id: лучший bm25 (меньший) первым."""
+    ids = array(TYPECODE)
+    with connection.cursor() as cursor:
+        cursor.execute(RANKED, [match, limit])
+        ids.extend(pk for pk, in cursor.fetchall())
+    return ids
+
+
+def snapshot_key(match, generation):
+    digest = hashlib.md5(match.encode()).hexdigest()
+    return f'{SNAPSHOT_PREFIX}:{generation}:{digest}'
+
+
+def snapshot(match, generation=None):
+    """(generation, ids) — ранжирование запроса, замороженное для листания.
+
+    Без generation берётся текущее поколение SCOPE. Снимок ранжируется
+    один раз на запрос и поколение, дальше читается из кэша. Снимок
+    прежнего поколения, вытесненный из кэша, не восстановить: (None, None).
+    """
+    current, = feed_cache.generations(SCOPE)
+    if generation is None:
+        generation = current
+    key = snapshot_key(match, generation)
+    ids = array(TYPECODE)
+    cached = cache.get(key)
+    if cached is not None:
+        ids.frombytes(cached)
+        return generation, ids
+    if generation != current:
+        return None, None
+    ids = ranked_ids(match, settings.SEARCH_RESULTS_LIMIT)
+    cache.set(key, ids.tobytes(), settings.SEARCH_SNAPSHOT_TIMEOUT)
+    return generation, ids
+
+
+def _posts(ids):
+    """Посты с id из ids в том же порядке; удалённые после снимка
+    пропускаются.
+    """
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
+
+
+class RankedPosts:
+    """Снимок запроса как object_list для старых ссылок ?page=N.
+
+    Снимок берётся при первом обращении, срез читает из базы только
+    посты своей страницы.
+    """
+
+    def __init__(self, match):
+        self.match = match
+
+    @cached_property
+    def ids(self):
+        if not self.match:
+            return array(TYPECODE)
+        return snapshot(self.match)[1]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        return _posts(self.ids[index])
+
+
+def install_triggers(using='default'):
+    """Восстанавливает потерянные триггеры и перестраивает индекс.
+
+    Возвращает True, если что-то пришлось восстанавливать.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return False
+    with db.cursor() as cursor:
+        cursor.execute(
+            'SELECT name FROM sqlite_master WHERE name = %s OR '
+            "(type = 'trigger' AND tbl_name = 'posts_post')", [FTS_TABLE])
+        existing = {name for name, in cursor.fetchall()}
+        missing = set(TRIGGERS) - existing
+        if FTS_TABLE not in existing or not missing:
+            return False
+        for name in missing:
+            cursor.execute(f'CREATE TRIGGER {name} {TRIGGERS[name]}')
+    rebuild(using)
+    return True
+
+
+def rebuild(using='default'):
+    """Заново наполняет индекс из posts_post; возвращает число постов."""
+    db = connections[using]
+    with transaction.atomic(using), db.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('delete-all')")
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) '
+            f"SELECT id, {NORMALIZE.format('text')} FROM posts_post")
+        count = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return count
+
+
+class SearchPaginator(CursorPaginator):
+    """Результаты поиска по ключу (поколение снимка, позиция в нём).
+
+    Страницы по курсору и по номеру берут срезы одного снимка (snapshot),
+    поэтому OFFSET не пересчитывается. Если снимок прежнего поколения
+    вытеснен из кэша, курсор ведёт на первую страницу.
+    """
+
+    def __init__(self, query, per_page, **kwargs):
+        self.match = match_expression(query)
+        super().__init__(RankedPosts(self.match), per_page, **kwargs)
+
+    def order(self, object_list, key_fields=None):
+        # Снимок уже упорядочен по рангу.
+        return object_list
+
+    def fetch(self, direction, key):
+        if not self.match:
+            return []
+        generation, position = key or (None, -1)
+        generation, ids = snapshot(self.match, generation)
+        if ids is None:
+            return []
+        if direction == NEXT:
+            positions = range(position + 1, len(ids))
+        else:
+            positions = range(position - 1, -1, -1)
+        positions = positions[:self.per_page + 1]
+        found = _posts([ids[index] for index in positions])
+        at = {ids[index]: index for index in positions}
+        for post in found:
+            post.search_position = generation, at[post.pk]
+        return found
+
+    async def afetch(self, direction, key):
+        # Снимок ранжируется сырым SQL, поэтому окно читается в потоке.
+        return await sync_to_async(self.fetch)(direction, key)
+
+    def cursor_key(self, post):
+        return post.search_position
+
+    def parse_key(self, values):
+        generation, position = values
+        return int(generation), int(position)
@@ -0,0 +1,224 @@
+"""Синтетические данные для прогонов в масштабе продакшена (seed_yatube).
+
+Строки создаются генераторами и пишутся порциями через bulk_create, поэтому
+в памяти держится только текущая порция и array id уже созданных записей
+(8 байт на запись). Все
+случайные решения берутся из одного random.Random(seed), так что прогон с тем
+же seed на пустой базе повторяет данные.
+
+Популярность авторов, плодовитость и обсуждаемость постов распределены по
+степенному закону: ранг r выпадает с вероятностью ~ r^-alpha, а ранги
+разбросаны по id перестановкой, чтобы популярные не шли подряд.
+"""
+import io
+import math
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import reset_queries
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from . import stats, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+GROUP_SHARE = 0.7
+VOCABULARY_SIZE = 3000
+
+
+class Zipf:
+    """Случайный номер 0..n-1 с вероятностью ~ (ранг + 1)^-alpha.
+
+    Ранг выбирается обращением непрерывной функции распределения, поэтому
+    памяти нужно O(1) при любом n.
+    """
+
+    def __init__(self, n, alpha, rng, salt=0):
+        self.n, self.alpha, self.rng = n, alpha, rng
+        self.stride = _coprime_stride(n, salt)
+
+    def __call__(self):
+        u = self.rng.random()
+        if math.isclose(self.alpha, 1):
+            rank = (self.n + 1) ** u
+        else:
+            power = 1 - self.alpha
+            rank = (((self.n + 1) ** power - 1) * u + 1) ** (1 / power)
+        rank = min(int(rank) - 1, self.n - 1)
+        return rank * self.stride % self.n
+
+
+def _coprime_stride(n, salt):
+    # Умножение на взаимно простое с n число — перестановка 0..n-1.
+    stride = int(n * 0.6180339887) + salt + 1
+    while math.gcd(stride, n) != 1:
+        stride += 1
+    return stride
+
+
+@contextmanager
+def explicit_dates(model, field_name):
+    """Даёт bulk_create записать свои даты в поле с auto_now_add."""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _last_pk(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def _bulk_create(model, batch, kwargs):
+    """id записей порции; сами объекты после вставки не нужны.
+
+    id возвращает bulk_create (RETURNING в SQLite 3.35+). С
+    ignore_conflicts их нет, и записи выбираются обратно по id между
+    максимумами до и после вставки порции.
+    """
+    if not kwargs.get('ignore_conflicts'):
+        return [obj.pk for obj in model.objects.bulk_create(batch, **kwargs)]
+    before = _last_pk(model)
+    model.objects.bulk_create(batch, **kwargs)
+    return model.objects.filter(
+        pk__gt=before, pk__lte=_last_pk(model)).order_by(
+        'pk').values_list('pk', flat=True)
+
+
+class Seeder:
+    def __init__(self, seed=None, chunk_size=5000, alpha=1.1, days=365,
+                 prefix='seed', password='yatube', log=print):
+        self.rng = random.Random(seed)
+        faker = Faker('ru_RU')
+        faker.seed_instance(seed)
+        self.words = faker.words(VOCABULARY_SIZE)
+        self.chunk_size, self.alpha, self.prefix = chunk_size, alpha, prefix
+        self.password = make_password(password)
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.log = log
+
+    def text(self, low, high):
+        words = self.rng.choices(self.words, k=self.rng.randint(low, high))
+        return ' '.join(words).capitalize() + '.'
+
+    def insert(self, model, rows, **kwargs):
+        """Пишет строки порциями; возвращает array id созданных записей."""
+        ids, batch = array('q'), []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.chunk_size:
+                ids.extend(_bulk_create(model, batch, kwargs))
+                # При DEBUG Django копит текст всех запросов.
+                reset_queries()
+                batch = []
+        if batch:
+            ids.extend(_bulk_create(model, batch, kwargs))
+        self.log(f'{model._meta.verbose_name_plural}: {len(ids)}')
+        return ids
+
+    def users(self, count):
+        first = _last_pk(User) + 1
+        return self.insert(User, (
+            User(username=f'{self.prefix}{first + i}', password=self.password)
+            for i in range(count)
+        ))
+
+    def groups(self, count):
+        first = _last_pk(Group) + 1
+        return self.insert(Group, (
+            Group(title=self.text(1, 3)[:-1],
+                  slug=f'{self.prefix}-{first + i}',
+                  description=self.text(5, 20))
+            for i in range(count)
+        ))
+
+    def images(self, count):
+        """Картинки-заглушки: посты делят между собой count файлов."""
+        names = []
+        for i in range(count):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            image = Image.new('RGB', (960, 640), color)
+            draw = ImageDraw.Draw(image)
+            for _ in range(8):
+                left, right = sorted(self.rng.sample(range(960), 2))
+                top, bottom = sorted(self.rng.sample(range(640), 2))
+                draw.ellipse((left, top, right, bottom), fill=tuple(
+                    self.rng.randrange(256) for _ in range(3)))
+            content = io.BytesIO()
+            image.save(content, 'JPEG', quality=80)
+            names.append(default_storage.save(
+                f'posts/{self.prefix}-{i}.jpg',
+                ContentFile(content.getvalue())))
+        return names
+
+    def post_date(self, index, count):
+        return self.start + (self.now - self.start) * index / max(count, 1)
+
+    def posts(self, count, users, groups, images=(), image_share=0.0):
+        authors = Zipf(len(users), self.alpha, self.rng, salt=1)
+        in_group = groups and Zipf(len(groups), self.alpha, self.rng, salt=2)
+
+        def rows():
+            for index in range(count):
+                group = None
+                if in_group and self.rng.random() < GROUP_SHARE:
+                    group = groups[in_group()]
+                image = None
+                if images and self.rng.random() < image_share:
+                    image = self.rng.choice(images)
+                yield Post(text=self.text(5, 60),
+                           pub_date=self.post_date(index, count),
+                           author_id=users[authors()],
+                           group_id=group, image=image)
+
+        with explicit_dates(Post, 'pub_date'):
+            return self.insert(Post, rows())
+
+    def comments(self, count, posts, users):
+        discussed = Zipf(len(posts), self.alpha, self.rng, salt=3)
+
+        def rows():
+            for _ in range(count):
+                index = discussed()
+                posted = self.post_date(index, len(posts))
+                yield Comment(
+                    post_id=posts[index], author_id=self.rng.choice(users),
+                    text=self.text(2, 30),
+                    created=posted + (self.now - posted) * self.rng.random())
+
+        with explicit_dates(Comment, 'created'):
+            return self.insert(Comment, rows())
+
+    def follows(self, count, users):
+        """Подписки: авторы по степенному закону, повторы отбрасываются."""
+        popular = Zipf(len(users), self.alpha, self.rng, salt=4)
+
+        def rows():
+            for _ in range(count):
+                user, author = self.rng.choice(users), users[popular()]
+                if user != author:
+                    yield Follow(user_id=user, author_id=author)
+
+        return self.insert(Follow, rows(), ignore_conflicts=True)
+
+    def finish(self, follows, timelines=True):
+        """Счётчики, ленты подписок и кэш: bulk_create не шлёт сигналов."""
+        stats.rebuild(chunk_size=self.chunk_size)
+        stats.reconcile_comment_counts(chunk_size=self.chunk_size)
+        if timelines:
+            timeline.materialize(follows, self.chunk_size)
+        cache.clear()
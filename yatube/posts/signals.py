@@ -0,0 +1,165 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import (feed_cache, follow_graph, jobs, search, stats, thumbnails,
+               timeline)
+from .models import AuthorStats, Comment, Follow, Group, Post
+from .page_cache import page_scope
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.author_id, posts_count=1)
+        jobs.enqueue(timeline.fan_out, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.bump(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.author_id, followers_count=1)
+        stats.bump(instance.user_id, following_count=1)
+        timeline.followers_changed(instance.author_id, 1)
+        jobs.enqueue(timeline.backfill, instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    stats.bump(instance.author_id, followers_count=-1)
+    stats.bump(instance.user_id, following_count=-1)
+    timeline.followers_changed(instance.author_id, -1)
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_values(sender, instance, **kwargs):
+    instance._old_group_id, instance._old_image = None, None
+    if not instance._state.adding:
+        instance._old_group_id, instance._old_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image').first() or (None, None))
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, **kwargs):
+    image = instance.image.name if instance.image else None
+    if image and image != getattr(instance, '_old_image', None):
+        jobs.enqueue(thumbnails.generate, image)
+
+
+def _user_page_scopes(*user_ids):
+    usernames = User.objects.filter(pk__in=user_ids).values_list(
+        'username', flat=True)
+    return {page_scope('user:{username}', username=username)
+            for username in usernames}
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    group_ids = {instance.group_id, getattr(instance, '_old_group_id', None)}
+    feed_cache.bump(search.SCOPE, *_post_scopes(
+        instance.pk, instance.author_id, group_ids))
+
+
+def _post_scopes(post_id, author_id, group_ids):
+    """Фрагменты лент и страницы, на которых виден пост."""
+    group_ids = set(group_ids) - {None}
+    scopes = {'index', f'user:{author_id}'}
+    scopes.update(f'group:{group_id}' for group_id in group_ids)
+    return scopes | _post_page_scopes(post_id, author_id, group_ids)
+
+
+def _post_page_scopes(post_id, author_id, group_ids):
+    """Страницы для анонимов (page_cache), на которых виден пост."""
+    scopes = _user_page_scopes(author_id)
+    scopes.add(page_scope('index'))
+    scopes.add(page_scope('post:{post_id}', post_id=post_id))
+    for slug in Group.objects.filter(pk__in=set(group_ids) - {None}
+                                     ).values_list('slug', flat=True):
+        scopes.add(page_scope('group:{slug}', slug=slug))
+    return scopes
+
+
+@receiver(thumbnails.thumbnails_ready)
+def invalidate_thumbnail_feeds(sender, name, **kwargs):
+    # Карточки, отрисованные до миниатюры, показывают оригинал картинки.
+    for post in Post.objects.filter(image=name).values(
+            'pk', 'author_id', 'group_id'):
+        feed_cache.bump(*_post_scopes(
+            post['pk'], post['author_id'], {post['group_id']}))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    feed_cache.bump(
+        'index', feed_cache.scope_of(instance), page_scope('index'),
+        page_scope('group:{slug}', slug=instance.slug))
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        stats.bump_comments(instance.post_id, 1)
+
+
+def _deleted_with_post(kwargs):
+    """Комментарий удаляется каскадом от удаления поста (или постов)."""
+    origin = kwargs.get('origin')
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is Post
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    # Счётчик уходит вместе с постом: без UPDATE на каждый комментарий.
+    if not _deleted_with_post(kwargs):
+        stats.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    # Ленты и страницы удалённого поста сбросит invalidate_post_feeds.
+    if _deleted_with_post(kwargs):
+        return
+    # Счётчик комментариев виден в карточке поста во всех лентах. Во
+    # фрагменты лент он подставляется при выдаче, поэтому сбрасываются
+    # только целые страницы для анонимов.
+    post = Post.objects.filter(pk=instance.post_id).values(
+        'author_id', 'group_id').first()
+    if post is None:
+        return
+    feed_cache.bump(*_post_page_scopes(
+        instance.post_id, post['author_id'], {post['group_id']}))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    follow_graph.invalidate(instance.user_id)
+    # Счётчики подписок видны в боковой панели профиля и поста.
+    feed_cache.bump(*_user_page_scopes(instance.user_id, instance.author_id))
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'posts':
+        search.install_triggers(using)
@@ -0,0 +1,109 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+
+def bump(user_id, **deltas):
+    """Сдвигает счётчики автора на deltas одним UPDATE с F-выражениями.
+
+    Если записи нет (пользователь добавлен мимо сигналов), после коммита
+    она создаётся с точными значениями. Раньше нельзя: пользователь может
+    удаляться в этой же транзакции вместе со своими счётчиками.
+    """
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+    if not updated:
+        transaction.on_commit(lambda: _create_missing(user_id))
+
+
+def _create_missing(user_id):
+    user = _with_totals(User.objects.filter(pk=user_id)).first()
+    if user is None:
+        return
+    logger.warning('У пользователя %s не было счётчиков, они пересчитаны',
+                   user_id)
+    AuthorStats.objects.bulk_create([_stats(user)], ignore_conflicts=True)
+
+
+def bump_comments(post_id, delta):
+    """Сдвигает Post.comments_count одним UPDATE с F-выражением."""
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta)
+
+
+def for_author(author):
+    """Счётчики автора; для пользователя без записи — нулевые."""
+    try:
+        return author.stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(user=author)
+
+
+def _count(model, field):
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by()
+    return Coalesce(Subquery(
+        rows.values(field).annotate(total=Count('pk')).values('total')), 0)
+
+
+def _with_totals(users):
+    return users.annotate(
+        posts_total=_count(Post, 'author'),
+        followers_total=_count(Follow, 'author'),
+        following_total=_count(Follow, 'user'),
+    )
+
+
+def _stats(user):
+    return AuthorStats(user_id=user.pk,
+                       posts_count=user.posts_total,
+                       followers_count=user.followers_total,
+                       following_count=user.following_total)
+
+
+def rebuild(chunk_size=1000):
+    """Пересчитывает счётчики всех пользователей порциями по chunk_size."""
+    users = _with_totals(User.objects.order_by('pk'))
+    last_pk, rebuilt = 0, 0
+    while True:
+        chunk = list(users.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return rebuilt
+        with transaction.atomic():
+            AuthorStats.objects.filter(
+                user_id__in=[user.pk for user in chunk]).delete()
+            AuthorStats.objects.bulk_create(_stats(user) for user in chunk)
+        last_pk = chunk[-1].pk
+        rebuilt += len(chunk)
+
+
+def reconcile_comment_counts(chunk_size=1000):
+    """Чинит расхождения Post.comments_count порциями постов по id.
+
+    Расхождение ищется сравнением с COUNT(*) комментариев, а исправляется
+    UPDATE с тем же подзапросом, поэтому комментарий, добавленный между
+    проверкой и записью, не теряется. Возвращает число исправленных постов.
+    """
+    posts = Post.objects.order_by('pk')
+    last_pk, repaired = 0, 0
+    while True:
+        chunk = posts.filter(pk__gt=last_pk)[:chunk_size]
+        bounds = list(chunk.values_list('pk', flat=True))
+        if not bounds:
+            return repaired
+        in_chunk = posts.filter(pk__gt=last_pk, pk__lte=bounds[-1])
+        drifted = list(in_chunk.annotate(
+            actual=_count(Comment, 'post')
+        ).exclude(comments_count=F('actual')).values_list('pk', flat=True))
+        if drifted:
+            repaired += Post.objects.filter(pk__in=drifted).update(
+                comments_count=_count(Comment, 'post'))
+        last_pk = bounds[-1]
@@ -0,0 +1,113 @@
+"""«Кого читать»: авторы, которых читают авторы из подписок пользователя.
+
+Оценка автора w для пользователя u — число путей u → v → w в графе
+подписок: сколько из тех, кого читает u, читают w. Если A — разреженная
+матрица подписок (строка — читатель, столбец — автор), это строка u
+произведения A·A. rebuild() загружает Follow в scipy.sparse, умножает
+порциями по batch_size читателей, убирает уже прочитанных и самого
+пользователя и оставляет top_k лучших. Таблица Suggestion заменяется
+целиком уже после расчёта, короткой транзакцией. Вьюхи читают её
+одним запросом по индексу (for_user).
+
+numpy и scipy нужны только для пересчёта (pip install numpy scipy):
+веб-воркеры без них работают, пока таблицу пересчитывает cron или
+отдельная машина.
+"""
+from itertools import chain
+
+from django.db import transaction
+
+from . import follow_graph
+from .models import Follow, Suggestion
+
+TOP_K = 10
+BATCH_SIZE = 1000
+
+
+def _numpy():
+    import numpy
+    from scipy import sparse
+
+    return numpy, sparse
+
+
+def load_edges(chunk_size=10000):
+    """Подписки из базы: массивы (читатели, авторы)."""
+    np, _ = _numpy()
+    pairs = np.fromiter(
+        chain.from_iterable(Follow.objects.values_list(
+            'user_id', 'author_id').iterator(chunk_size=chunk_size)),
+        dtype=np.int32)
+    return pairs[0::2], pairs[1::2]
+
+
+def iter_top_k(users, authors, top_k=TOP_K, batch_size=BATCH_SIZE):
+    """Лучшие top_k авторов для каждого читателя, порциями.
+
+    Отдаёт тройки массивов (читатели, авторы, оценки), отсортированные по
+    читателю, убыванию оценки и id автора.
+    """
+    np, sparse = _numpy()
+    if not len(users):
+        return
+    size = int(max(users.max(), authors.max())) + 1
+    follows = sparse.csr_matrix(
+        (np.ones(len(users), dtype=np.int32), (users, authors)),
+        shape=(size, size))
+    readers = np.unique(users)
+    for start in range(0, len(readers), batch_size):
+        rows = readers[start:start + batch_size]
+        batch = follows[rows]
+        scores = (batch @ follows).tocoo()
+        # Уже прочитанные и сам читатель: ключи строка * size + столбец.
+        followed = batch.tocoo()
+        excluded = np.concatenate((
+            followed.row.astype(np.int64) * size + followed.col,
+            np.arange(len(rows), dtype=np.int64) * size + rows))
+        keep = ~np.isin(scores.row.astype(np.int64) * size + scores.col,
+                        excluded)
+        row, col, score = scores.row[keep], scores.col[keep], scores.data[keep]
+        order = np.lexsort((col, -score, row))
+        row, col, score = row[order], col[order], score[order]
+        # Место автора в своей строке: номер минус начало строки.
+        starts = np.searchsorted(row, row)
+        best = np.arange(len(row)) - starts < top_k
+        yield rows[row[best]], col[best], score[best]
+
+
+def rebuild(top_k=TOP_K, batch_size=BATCH_SIZE, chunk_size=10000):
+    """Пересчитывает Suggestion целиком; возвращает число записей.
+
+    Расчёт идёт вне транзакции: блокировка записи в SQLite держится
+    только на удаление старых строк и вставку новых.
+    """
+    np, _ = _numpy()
+    batches = list(iter_top_k(*load_edges(chunk_size), top_k, batch_size))
+    if batches:
+        readers, suggested, scores = (
+            np.concatenate(column).tolist() for column in zip(*batches))
+    else:
+        readers = suggested = scores = []
+    with transaction.atomic():
+        Suggestion.objects.all().delete()
+        Suggestion.objects.bulk_create(
+            (Suggestion(user_id=user_id, author_id=author_id, score=score)
+             for user_id, author_id, score in zip(
+                 readers, suggested, scores)),
+            batch_size=chunk_size)
+    return len(readers)
+
+
+def for_user(user, limit=5):
+    """Подсказки для пользователя без тех, на кого он подписался после
+    пересчёта; подписки проверяются по кэшу follow_graph.
+    """
+    if not user.is_authenticated:
+        return []
+    rows = list(Suggestion.objects.filter(user=user).select_related(
+        'author')[:limit * 2])
+    if not rows:
+        return []
+    followed = follow_graph.follows_many(
+        user.id, [row.author_id for row in rows])
+    return [row for row in rows if row.author_id not in followed][:limit]
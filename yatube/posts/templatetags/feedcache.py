@@ -0,0 +1,65 @@
+import re
+
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import feed_cache
+
+register = template.Library()
+
+# Внутри фрагмента ленты вместо числа комментариев пишется метка; число
+# подставляется при каждой выдаче из постов страницы, так что новый
+# комментарий не сбрасывает фрагменты лент.
+IN_FRAGMENT = '_feedcache_fragment'
+COMMENTS_MARK = '<!--comments:{}-->'
+COMMENTS_MARK_RE = re.compile(r'<!--comments:(\d+)-->')
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, scope, vary_on):
+        self.nodelist = nodelist
+        self.scope = scope
+        self.vary_on = vary_on
+
+    def render(self, context):
+        scope = feed_cache.scope_of(self.scope.resolve(context))
+        vary_on = [var.resolve(context) for var in self.vary_on]
+
+        def render_fragment():
+            with context.push({IN_FRAGMENT: True}):
+                return self.nodelist.render(context)
+
+        content = feed_cache.render(scope, vary_on, render_fragment)
+        counts = {post.pk: post.comments_count
+                  for post in context.get('page') or ()}
+        return mark_safe(COMMENTS_MARK_RE.sub(
+            lambda match: str(counts.get(int(match[1]), match[0])),
+            content))
+
+
+@register.tag('feedcache')
+def do_feedcache(parser, token):
+    """Кэширует фрагмент ленты до смены поколения области.
+
+    {% feedcache 'index' page.number %} ... {% endfeedcache %}
+    {% feedcache group page.number %} ... {% endfeedcache %}
+
+    Посты ленты берутся из переменной page: по ним заполняются метки
+    {% comments_count %}.
+    """
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least 1 argument.")
+    scope, *vary_on = (parser.compile_filter(bit) for bit in bits[1:])
+    return FeedCacheNode(nodelist, scope, vary_on)
+
+
+@register.simple_tag(takes_context=True)
+def comments_count(context, post):
+    """Число комментариев поста; во фрагменте ленты — метка для него."""
+    if context.get(IN_FRAGMENT):
+        return mark_safe(COMMENTS_MARK.format(post.pk))
+    return post.comments_count
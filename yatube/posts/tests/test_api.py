@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        for i in range(25):
+            cls.post = Post.objects.create(
+                text=f'Текст {i}', author=cls.author,
+                group=cls.group if i % 2 else None)
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}')
+
+    def setUp(self):
+        self.client = Client()
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_posts_are_paged_by_cursor(self):
+        first = self.get(reverse('api:posts'))
+        self.assertEqual(len(first['results']), 20)
+        self.assertEqual(first['results'][0], {
+            'id': self.post.id,
+            'text': 'Текст 24',
+            'pub_date': self.post.pub_date.isoformat(),
+            'author': 'author',
+            'group': None,
+            'image': None,
+            'comments_count': 3,
+        })
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 25)
+
+    def test_fields_limit_selected_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(reverse('api:posts'), fields='id,text', limit=5)
+        self.assertEqual(list(data['results'][0]), ['id', 'text'])
+        self.assertEqual(len(data['results']), 5)
+        self.assertIn('limit=5', data['next'])
+        self.assertIn('fields=id%2Ctext', data['next'])
+        sql = queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"comments_count"', sql)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('api:posts'), {'fields': 'id,pw'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pw', response.json()['detail'])
+
+    def test_group_and_user_posts(self):
+        group = self.get(reverse('api:group_posts', args=['test-slug']),
+                         fields='group')
+        self.assertEqual(len(group['results']), 12)
+        self.assertEqual({row['group'] for row in group['results']},
+                         {'test-slug'})
+        user = self.get(reverse('api:user_posts', args=['author']))
+        self.assertEqual(len(user['results']), 20)
+
+    def test_post_comments_newest_first(self):
+        data = self.get(reverse('api:post_comments', args=[self.post.id]),
+                        fields='text,post')
+        self.assertEqual(data['results'], [
+            {'text': f'Комментарий {i}', 'post': self.post.id}
+            for i in range(2, -1, -1)
+        ])
+
+    def test_missing_objects_return_json_404(self):
+        for url in (reverse('api:group_posts', args=['nope']),
+                    reverse('api:user_posts', args=['nobody']),
+                    reverse('api:post_comments', args=[0])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', response.json())
+
+    def test_api_is_read_only(self):
+        response = self.client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
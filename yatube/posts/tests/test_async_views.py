@@ -0,0 +1,148 @@
+import io
+import json
+import re
+import zipfile
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import close_old_connections
+from django.http import Http404
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
+from django.urls import reverse
+from posts import async_views, views
+from posts.models import Comment, Follow, Group, Post
+
+from yatube.asgi_handler import ASGIHandler
+
+User = get_user_model()
+
+CSRF = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]*"')
+
+
+class AsyncViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        for i in range(12):
+            cls.post = Post.objects.create(
+                text=f'Текст {i}', author=cls.author, group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ок')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def request(self, factory, url, user):
+        request = factory.get(url)
+        request.user = user
+        return request
+
+    async def assertSameAsSync(self, name, url, **kwargs):
+        """Async-вьюха отдаёт ту же страницу, что и синхронная."""
+        sync_response = await sync_to_async(getattr(views, name))(
+            self.request(RequestFactory(), url, self.reader), **kwargs)
+        async_response = await getattr(async_views, name)(
+            self.request(AsyncRequestFactory(), url, self.reader), **kwargs)
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(CSRF.sub(b'', async_response.content),
+                         CSRF.sub(b'', sync_response.content))
+
+    async def test_pages_match_sync_views(self):
+        cases = [
+            ('index', reverse('posts:index'), {}),
+            ('group_posts', reverse('posts:group', args=['test-slug']),
+             {'slug': 'test-slug'}),
+            ('profile', reverse('posts:profile', args=['author']),
+             {'username': 'author'}),
+            ('post_view', reverse('posts:post', args=['author', self.post.id]),
+             {'username': 'author', 'post_id': self.post.id}),
+            ('follow_index', reverse('posts:follow_index'), {}),
+        ]
+        for name, url, kwargs in cases:
+            with self.subTest(view=name):
+                await self.assertSameAsSync(name, url, **kwargs)
+
+    async def test_cursor_page_matches_sync_view(self):
+        first = await async_views.index(self.request(
+            AsyncRequestFactory(), reverse('posts:index'), self.reader))
+        cursor = re.search(rb'cursor=([\w-]+)', first.content).group(1)
+        await self.assertSameAsSync(
+            'index', f'{reverse("posts:index")}?cursor={cursor.decode()}')
+
+    async def test_missing_objects_raise_404(self):
+        request = self.request(
+            AsyncRequestFactory(), '/group/nope/', self.reader)
+        with self.assertRaises(Http404):
+            await async_views.group_posts(request, slug='nope')
+
+    async def test_follow_index_requires_login(self):
+        url = reverse('posts:follow_index')
+        response = await async_views.follow_index(
+            self.request(AsyncRequestFactory(), url, AnonymousUser()))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, f'/auth/login/?next={url}')
+
+    async def test_anonymous_page_is_cached(self):
+        url = reverse('posts:index')
+        first = await async_views.index(
+            self.request(AsyncRequestFactory(), url, AnonymousUser()))
+        request = self.request(AsyncRequestFactory(), url, AnonymousUser())
+        request.META['HTTP_IF_NONE_MATCH'] = first['ETag']
+        second = await async_views.index(request)
+        self.assertEqual(second.status_code, 304)
+
+
+class ASGIExportTest(TestCase):
+    """Архив автора отдаётся через ASGI-обработчик целиком."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        post = Post.objects.create(text='Текст', author=cls.author)
+        Comment.objects.create(post=post, author=cls.author, text='Мой')
+
+    def get(self, url, query=''):
+        self.client.force_login(self.author)
+        cookie = f'sessionid={self.client.cookies["sessionid"].value}'
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'method': 'GET',
+            'path': url, 'query_string': query.encode(), 'headers': [
+                (b'cookie', cookie.encode()), (b'host', b'testserver')],
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request'}
+
+        async def send(message):
+            messages.append(message)
+
+        # Как тестовый клиент: соединение живёт в транзакции теста.
+        request_started.disconnect(close_old_connections)
+        try:
+            async_to_sync(ASGIHandler())(scope, receive, send)
+        finally:
+            request_started.connect(close_old_connections)
+        self.assertEqual(messages[0]['status'], 200)
+        return b''.join(message.get('body', b'')
+                        for message in messages[1:])
+
+    def test_zip_archive(self):
+        body = self.get(reverse('posts:profile_export', args=['author']))
+        archive = zipfile.ZipFile(io.BytesIO(body))
+        self.assertEqual(archive.namelist(),
+                         ['post.ndjson', 'comment.ndjson'])
+        self.assertEqual(
+            json.loads(archive.read('comment.ndjson'))['text'], 'Мой')
+
+    def test_ndjson_archive(self):
+        body = self.get(reverse('posts:profile_export', args=['author']),
+                        'format=ndjson')
+        self.assertEqual(
+            [json.loads(line)['model'] for line in body.splitlines()],
+            ['post', 'comment'])
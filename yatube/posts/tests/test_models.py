@@ -1,9 +1,62 @@
+import random
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from posts.models import Group, Post
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from posts import follow_graph, jobs, search, seed, suggestions
+from posts.models import (AuthorStats, Comment, Follow, Group, Job, Post,
+                          Suggestion, TimelineEntry)
 
 User = get_user_model()
 
+try:
+    import numpy  # noqa: F401
+    import scipy  # noqa: F401
+except ImportError:
+    numpy = None
+
+FAILURES = []
+
+
+class BrokenPool:
+    """Пул, процессы которого умерли."""
+
+    def submit(self, *args):
+        raise BrokenProcessPool('процесс пула завершился')
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class InlinePool(BrokenPool):
+    """Пул, выполняющий задачи сразу в текущем процессе."""
+
+    def submit(self, function, name, args):
+        future = Future()
+        future.set_result(jobs.execute(name, args))
+        return future
+
+
+@jobs.task
+def flaky(key):
+    """Падает, пока в FAILURES есть key."""
+    if key in FAILURES:
+        FAILURES.remove(key)
+        raise RuntimeError(f'сбой {key}')
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -56,3 +109,439 @@ class PostModelTest(TestCase):
         expected_group_name = group.title
         self.assertEqual(expected_object_name, str(post.text))
         self.assertEqual(expected_group_name, str(group.title))
+
+
+class AuthorStatsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_create_and_delete_update_counter(self):
+        post = Post.objects.create(text='Текст', author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_follow_create_and_delete_update_counters(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_missing_counters_are_recreated_after_commit(self):
+        AuthorStats.objects.filter(user=self.author).delete()
+        Follow.objects.create(user=self.reader, author=self.author)
+        with self.assertLogs('posts.stats', 'WARNING'), \
+                self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text='Текст', author=self.author)
+        stats = self.stats(self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 1))
+
+    def test_deleted_user_gets_no_counters(self):
+        Post.objects.create(text='Текст', author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.delete()
+        self.assertFalse(
+            AuthorStats.objects.filter(user_id=self.author.pk).exists())
+        self.assertEqual(self.stats(self.reader).followers_count, 0)
+
+    def test_rebuild_command_repairs_counters(self):
+        Post.objects.create(text='Текст', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.all().delete()
+        call_command('rebuild_author_stats', chunk_size=1, stdout=StringIO())
+        stats = self.stats(self.author)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (1, 1, 0))
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+
+
+class CommentsCountTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(text='Текст', author=self.author)
+
+    def count(self, post):
+        return Post.objects.values_list(
+            'comments_count', flat=True).get(pk=post.pk)
+
+    def test_comment_create_and_delete_update_counter(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text='Первый')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Второй')
+        self.assertEqual(self.count(self.post), 2)
+        comment.delete()
+        self.assertEqual(self.count(self.post), 1)
+
+    def test_post_delete_skips_per_comment_signals(self):
+        """Каскад от поста не обновляет счётчик и ленты за каждый
+        комментарий: число запросов не зависит от числа комментариев.
+        """
+        queries = []
+        for count in (1, 10):
+            post = Post.objects.create(text='Текст', author=self.author)
+            for _ in range(count):
+                Comment.objects.create(
+                    post=post, author=self.author, text='Комментарий')
+            with CaptureQueriesContext(connection) as captured:
+                post.delete()
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_reconcile_command_repairs_drift(self):
+        other = Post.objects.create(text='Другой', author=self.author)
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.author, text='Мимо сигналов')
+            for _ in range(3)
+        ])
+        Post.objects.filter(pk=other.pk).update(comments_count=7)
+        out = StringIO()
+        call_command('reconcile_comment_counts', chunk_size=1, stdout=out)
+        self.assertEqual(
+            (self.count(self.post), self.count(other)), (3, 0))
+        self.assertIn('2 постов', out.getvalue())
+
+
+class FollowGraphTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader')
+        self.authors = [User.objects.create_user(username=f'author{i}')
+                        for i in range(4)]
+        for author in reversed(self.authors[:3]):
+            Follow.objects.create(user=self.reader, author=author)
+
+    def test_followees_are_sorted_and_cached(self):
+        ids = [author.id for author in self.authors[:3]]
+        self.assertEqual(list(follow_graph.followees(self.reader.id)), ids)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                list(follow_graph.followees(self.reader.id)), ids)
+            self.assertTrue(follow_graph.follows(
+                self.reader.id, self.authors[1].id))
+            self.assertFalse(follow_graph.follows(
+                self.reader.id, self.authors[3].id))
+            self.assertEqual(
+                follow_graph.follows_many(
+                    self.reader.id, [author.id for author in self.authors]),
+                set(ids))
+            self.assertFalse(follow_graph.follows(None, self.authors[0].id))
+
+    def test_follow_changes_invalidate_cache(self):
+        follow_graph.followees(self.reader.id)
+        Follow.objects.create(user=self.reader, author=self.authors[3])
+        self.assertTrue(follow_graph.follows(
+            self.reader.id, self.authors[3].id))
+        Follow.objects.filter(
+            user=self.reader, author=self.authors[0]).delete()
+        self.assertFalse(follow_graph.follows(
+            self.reader.id, self.authors[0].id))
+
+    def test_list_loaded_before_change_is_not_reused(self):
+        """Запоздавшая запись списка, прочитанного до подписки."""
+        stale = follow_graph.followees(self.reader.id)
+        generation = cache.get(follow_graph.generation_key(self.reader.id))
+        Follow.objects.create(user=self.reader, author=self.authors[3])
+        cache.set(follow_graph.cache_key(self.reader.id),
+                  (generation, stale.tobytes()))
+        self.assertTrue(follow_graph.follows(
+            self.reader.id, self.authors[3].id))
+
+
+class SuggestionsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {name: User.objects.create_user(username=name)
+                      for name in ('reader', 'a', 'b', 'c', 'd')}
+        for user, author in (('reader', 'a'), ('reader', 'b'), ('a', 'c'),
+                             ('b', 'c'), ('b', 'd'), ('a', 'reader'),
+                             ('b', 'a')):
+            Follow.objects.create(user=self.users[user],
+                                  author=self.users[author])
+
+    def suggested(self, name):
+        return [(row.author.username, row.score)
+                for row in suggestions.for_user(self.users[name])]
+
+    @unittest.skipUnless(numpy, 'нужны numpy и scipy')
+    def test_rebuild_ranks_friends_of_friends(self):
+        Suggestion.objects.create(
+            user=self.users['c'], author=self.users['d'], score=9)
+        out = StringIO()
+        call_command('compute_suggestions', top_k=2, batch_size=2,
+                     stdout=out)
+        # Себя и уже прочитанного «a» reader не видит.
+        self.assertEqual(self.suggested('reader'), [('c', 2), ('d', 1)])
+        self.assertEqual(self.suggested('b'), [('reader', 1)])
+        self.assertEqual(self.suggested('c'), [])
+        self.assertIn('Подсказок: 4', out.getvalue())
+
+    @unittest.skipUnless(numpy, 'нужны numpy и scipy')
+    def test_rebuild_without_follows_empties_table(self):
+        Suggestion.objects.create(
+            user=self.users['c'], author=self.users['d'], score=9)
+        Follow.objects.all().delete()
+        self.assertEqual(suggestions.rebuild(), 0)
+        self.assertFalse(Suggestion.objects.exists())
+
+    def test_followed_authors_are_hidden_until_rebuild(self):
+        for author, score in (('c', 2), ('d', 1)):
+            Suggestion.objects.create(
+                user=self.users['reader'], author=self.users[author],
+                score=score)
+        self.assertEqual(self.suggested('reader'), [('c', 2), ('d', 1)])
+        Follow.objects.create(user=self.users['reader'],
+                              author=self.users['c'])
+        self.assertEqual(self.suggested('reader'), [('d', 1)])
+
+
+@override_settings(JOBS_ASYNC=True, JOBS_RETRY_BACKOFF=10)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        FAILURES.clear()
+
+    def run_workers(self, failing=False):
+        with (self.assertLogs('posts.jobs', 'ERROR') if failing
+              else nullcontext()):
+            call_command('run_workers', processes=0, once=True,
+                         stdout=StringIO(), stderr=StringIO())
+
+    def make_ready(self):
+        Job.objects.update(run_after=timezone.now() - timedelta(seconds=1))
+
+    def test_signal_enqueues_fan_out_for_workers(self):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(text='Текст', author=author)
+        self.assertEqual(
+            list(Job.objects.order_by('pk').values_list('task', 'args')),
+            [('posts.timeline.backfill', [reader.pk, author.pk]),
+             ('posts.timeline.fan_out', [post.pk])])
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.run_workers()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=post).exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_claim_is_batched_and_leased(self):
+        for key in range(5):
+            jobs.enqueue(flaky, key)
+        first = jobs.claim(2, visibility_timeout=60)
+        second = jobs.claim(10, visibility_timeout=60)
+        self.assertEqual([job.args for job in first], [[0], [1]])
+        self.assertEqual([job.args for job in second], [[2], [3], [4]])
+        self.assertEqual(jobs.claim(10, visibility_timeout=60), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        jobs.enqueue(flaky, 'key')
+        stale = jobs.claim(1, visibility_timeout=60)[0]
+        self.make_ready()
+        fresh = jobs.claim(1, visibility_timeout=60)[0]
+        self.assertEqual(fresh.attempts, 2)
+        jobs.complete(stale)
+        self.assertTrue(Job.objects.exists())
+        jobs.complete(fresh)
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job_is_retried_with_backoff(self):
+        FAILURES.extend(['key', 'key'])
+        jobs.enqueue(flaky, 'key')
+        self.run_workers(failing=True)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('сбой key', job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(
+            seconds=9))
+        self.make_ready()
+        self.run_workers(failing=True)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(
+            seconds=19))
+        self.make_ready()
+        self.run_workers()
+        self.assertFalse(Job.objects.exists())
+
+    def test_broken_pool_fails_job_and_is_replaced(self):
+        jobs.enqueue(flaky, 'key')
+        pools = [BrokenPool(), InlinePool(), InlinePool()]
+        with mock.patch('posts.jobs._pool', side_effect=pools), \
+                self.assertLogs('posts.jobs', 'ERROR'):
+            done, failed = jobs.work(processes=1, once=True,
+                                     poll_interval=0)
+            self.make_ready()
+            done_again, _ = jobs.work(processes=1, once=True,
+                                      poll_interval=0)
+        self.assertEqual((done, failed, done_again), (0, 1, 1))
+        self.assertFalse(Job.objects.exists())
+
+    def test_job_fails_after_max_attempts(self):
+        FAILURES.extend(['key'] * 3)
+        jobs.enqueue(flaky, 'key', max_attempts=2)
+        self.run_workers(failing=True)
+        self.make_ready()
+        self.run_workers(failing=True)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.make_ready()
+        self.run_workers()
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_rollback_drops_enqueued_job(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                jobs.enqueue(flaky, 'key')
+                raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create([
+            Post(text='Первый пост', author=author),
+            Post(text='Второй пост', author=author),
+        ])
+
+    def test_bulk_create_is_indexed(self):
+        self.assertEqual(
+            search.filter_posts(Post.objects, 'пост').count(), 2)
+
+    def test_rebuild_command_restores_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO posts_post_fts (posts_post_fts) "
+                "VALUES ('delete-all')")
+        self.assertFalse(search.filter_posts(Post.objects, 'пост').exists())
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('2', out.getvalue())
+        self.assertEqual(
+            search.filter_posts(Post.objects, 'второй').count(), 1)
+
+    def test_lost_triggers_are_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        self.assertTrue(search.install_triggers())
+        self.assertFalse(search.install_triggers())
+        Post.objects.create(text='Третий пост',
+                            author=User.objects.get(username='author'))
+        self.assertEqual(
+            search.filter_posts(Post.objects, 'третий').count(), 1)
+
+
+class SeedCommandTest(TestCase):
+    def test_seed_creates_consistent_data(self):
+        call_command('seed_yatube', users=30, groups=3, posts=200,
+                     comments=100, follows=150, seed=1, chunk_size=40,
+                     stdout=StringIO())
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Post.objects.filter(group__isnull=False).exists())
+        self.assertGreater(
+            Post.objects.latest('pub_date').pub_date,
+            Post.objects.earliest('pub_date').pub_date)
+        for stats in AuthorStats.objects.all():
+            self.assertEqual(stats.posts_count, stats.user.posts.count())
+            self.assertEqual(
+                stats.followers_count, stats.user.following.count())
+        expected = sum(follow.author.posts.count()
+                       for follow in Follow.objects.all())
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+
+    def test_insert_returns_only_own_ids(self):
+        seeder = seed.Seeder(seed=1, chunk_size=2, log=lambda message: None)
+
+        def rows():
+            for i in range(4):
+                if i == 2:
+                    # Запись другого процесса между порциями.
+                    Group.objects.create(title='Чужая', slug='other')
+                yield Group(title=f'Группа {i}', slug=f'group-{i}')
+
+        ids = seeder.insert(Group, rows())
+        self.assertEqual(list(ids), list(Group.objects.exclude(
+            slug='other').order_by('pk').values_list('pk', flat=True)))
+
+    def test_insert_ignoring_conflicts_returns_only_own_ids(self):
+        seeder = seed.Seeder(seed=1, chunk_size=2, log=lambda message: None)
+        users = [User.objects.create_user(username=f'user{i}')
+                 for i in range(4)]
+        Follow.objects.create(user=users[0], author=users[1])
+
+        def rows():
+            for i, author in enumerate(users[1:]):
+                if i == 2:
+                    # Запись другого процесса между порциями.
+                    Follow.objects.create(user=users[1], author=users[2])
+                yield Follow(user=users[0], author=author)
+
+        ids = seeder.insert(Follow, rows(), ignore_conflicts=True)
+        self.assertEqual(list(ids), list(Follow.objects.filter(
+            user=users[0], author__in=users[2:]).order_by(
+            'pk').values_list('pk', flat=True)))
+
+    def test_same_seed_repeats_power_law_sample(self):
+        def sample(value):
+            rng = random.Random(value)
+            draw = seed.Zipf(1000, 1.1, rng)
+            return [draw() for _ in range(2000)]
+
+        self.assertEqual(sample(5), sample(5))
+        self.assertNotEqual(sample(5), sample(6))
+        counts = sorted(
+            (sample(5).count(value) for value in set(sample(5))),
+            reverse=True)
+        self.assertGreater(counts[0], 20 * counts[len(counts) // 2])
+
+
+class NdjsonTransferTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        return [
+            list(Group.objects.order_by('pk').values()),
+            list(Post.objects.order_by('pk').values(
+                'id', 'text', 'pub_date', 'author__username', 'group_id',
+                'image')),
+            list(Comment.objects.order_by('pk').values(
+                'id', 'post_id', 'author__username', 'text', 'created')),
+            list(Follow.objects.order_by('pk').values(
+                'id', 'user__username', 'author__username')),
+        ]
+
+    def test_export_and_import_round_trip(self):
+        call_command('seed_yatube', users=10, groups=2, posts=30,
+                     comments=20, follows=15, seed=3, stdout=StringIO())
+        before = self.snapshot()
+        call_command('export_ndjson', self.directory, chunk_size=7,
+                     stdout=StringIO())
+        for model in (Follow, Comment, Post, Group):
+            model.objects.all().delete()
+        User.objects.filter(username='seed1').delete()
+
+        out = StringIO()
+        call_command('import_ndjson', self.directory, chunk_size=7,
+                     stdout=out)
+        total = sum(len(rows) for rows in before)
+        self.assertIn(f'Загружено объектов: {total},', out.getvalue())
+        self.assertEqual(self.snapshot(), before)
+        self.assertFalse(
+            User.objects.get(username='seed1').has_usable_password())
+        self.assertEqual(
+            TimelineEntry.objects.count(),
+            sum(follow.author.posts.count()
+                for follow in Follow.objects.all()))
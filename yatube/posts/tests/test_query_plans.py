@@ -0,0 +1,117 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Полный проход по таблице («SCAN posts_post» без индекса) или сортировка
+# во временном B-дереве. Упорядоченный обход индекса с LIMIT допустим.
+# Поиск сюда не входит: ранжирование по bm25 всегда сортирует совпадения.
+BAD_STEP = re.compile(r'^SCAN (?!.*\bUSING (COVERING )?INDEX\b)|TEMP B-TREE')
+
+
+class QueryPlanTest(TestCase):
+    """Запросы вьюх читают таблицы по индексам и не сортируют в памяти."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        for i in range(12):
+            cls.post = Post.objects.create(
+                text=f'Текст {i}', author=cls.author, group=cls.group)
+        for i in range(25):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Ок {i}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def plan(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def captured_selects(self, client, url):
+        queries = []
+
+        def collect(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(collect):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return queries
+
+    def next_page(self, url):
+        page = self.client.get(url).context['page']
+        cache.clear()
+        separator = '&' if '?' in url else '?'
+        return f'{url}{separator}cursor={page.next_cursor}'
+
+    def assertPlansUseIndexes(self, url, guest=True):
+        """Каждый SELECT вьюхи — у пользователя и гостя — без полного SCAN."""
+        clients = [self.client, Client()] if guest else [self.client]
+        for client in clients:
+            for sql, params in self.captured_selects(client, url):
+                bad = [step for step in self.plan(sql, params)
+                       if BAD_STEP.search(step)]
+                with self.subTest(url=url, sql=sql):
+                    self.assertEqual(bad, [])
+
+    def test_bad_plan_is_detected(self):
+        queryset = Post.objects.order_by('text')
+        sql, params = queryset.query.sql_with_params()
+        self.assertTrue(any(
+            BAD_STEP.search(step) for step in self.plan(sql, params)))
+
+    def test_index(self):
+        url = reverse('posts:index')
+        self.assertPlansUseIndexes(url)
+        self.assertPlansUseIndexes(self.next_page(url))
+
+    def test_group(self):
+        url = reverse('posts:group', args=['test-slug'])
+        self.assertPlansUseIndexes(url)
+        self.assertPlansUseIndexes(self.next_page(url))
+
+    def test_profile(self):
+        url = reverse('posts:profile', args=['author'])
+        self.assertPlansUseIndexes(url)
+        self.assertPlansUseIndexes(self.next_page(url))
+
+    def test_post_with_comments(self):
+        url = reverse('posts:post', args=['author', self.post.id])
+        self.assertPlansUseIndexes(url)
+        cursor = self.client.get(url).context['comments'].next_cursor
+        self.assertPlansUseIndexes(
+            reverse('posts:post_comments', args=['author', self.post.id])
+            + f'?cursor={cursor}')
+
+    def test_follow_index(self):
+        url = reverse('posts:follow_index')
+        self.assertPlansUseIndexes(url, guest=False)
+        self.assertPlansUseIndexes(self.next_page(url), guest=False)
+
+    def test_api(self):
+        urls = [
+            reverse('api:posts'),
+            reverse('api:group_posts', args=['test-slug']),
+            reverse('api:user_posts', args=['author']),
+            reverse('api:post_comments', args=[self.post.id]),
+        ]
+        for url in urls:
+            self.assertPlansUseIndexes(url, guest=False)
+            cursor = self.client.get(url, {'limit': 5}).json()['next']
+            self.assertPlansUseIndexes(cursor, guest=False)
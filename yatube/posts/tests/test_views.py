@@ -1,14 +1,24 @@
+import io
+import json
 import shutil
 import tempfile
+import zipfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core import mail
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Comment, Follow, Group, Post
+from posts import feed_cache, thumbnails, views
+from posts.models import (Comment, Follow, Group, Job, Post, Suggestion,
+                          TimelineEntry)
 
 User = get_user_model()
 
@@ -156,6 +166,129 @@ class PostPagesTest(TestCase):
         self.assertEqual(response.context['author'], self.user)
         self.assertEqual(response.context['post'].image, self.post.image)
 
+    def test_author_sidebar_without_aggregate_queries(self):
+        """Боковая панель автора берёт счётчики из AuthorStats"""
+        Follow.objects.create(user=self.author, author=self.user)
+        urls = (
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post', args=[self.user.username, self.post.id]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(url)
+                self.assertContains(response, 'Подписчиков: 1')
+                self.assertContains(response, 'Записей: 1')
+                self.assertFalse(any(
+                    'COUNT(' in query['sql'] for query in queries))
+
+    def test_thumbnail_is_pregenerated_on_save(self):
+        """Миниатюра создаётся при сохранении поста, а не при рендере"""
+        thumbnail = thumbnails.cached_thumbnails(
+            [self.post.image], '960x339', crop='center', upscale=True
+        ).get(self.post.image.name)
+        self.assertIsNotNone(thumbnail)
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend'
+                        '._create_thumbnail') as create:
+            response = self.authorized_client.get(reverse('posts:index'))
+        create.assert_not_called()
+        self.assertContains(response, thumbnail.url)
+
+    def test_thumbnails_of_page_are_read_in_one_lookup(self):
+        """Миниатюры всей страницы читаются одним запросом к KVStore"""
+        for i in range(3):
+            Post.objects.create(
+                text=f'Картинка {i}', author=self.user,
+                image=SimpleUploadedFile(f'image{i}.gif', self.small_gif,
+                                         content_type='image/gif'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        kvstore_queries = [query for query in queries
+                           if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertTrue(all(
+            post.thumbnail for post in response.context['page']))
+
+    @override_settings(JOBS_ASYNC=True)
+    def test_missing_thumbnail_falls_back_to_original(self):
+        post = Post.objects.create(
+            text='Без миниатюры', author=self.user,
+            image=SimpleUploadedFile('other.gif', self.small_gif,
+                                     content_type='image/gif'))
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend'
+                        '._create_thumbnail') as create:
+            response = self.authorized_client.get(
+                reverse('posts:post', args=[self.user.username, post.id]))
+        create.assert_not_called()
+        self.assertContains(response, post.image.url)
+
+    @override_settings(JOBS_ASYNC=True)
+    def test_feed_shows_thumbnail_once_generated(self):
+        """Лента, закэшированная с оригиналом, сбрасывается миниатюрой"""
+        post = Post.objects.create(
+            text='Позже', author=self.user,
+            image=SimpleUploadedFile('later.gif', self.small_gif,
+                                     content_type='image/gif'))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, post.image.url)
+        thumbnails.generate(post.image.name)
+        thumbnail = thumbnails.cached_thumbnails(
+            [post.image], '960x339', crop='center', upscale=True
+        ).get(post.image.name)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+
+    @override_settings(JOBS_ASYNC=True)
+    def test_failed_edit_rolls_back_its_jobs(self):
+        """Задача из сигнала коммитится только вместе с правкой"""
+        url = reverse('posts:post_edit',
+                      args=[self.user.username, self.post.id])
+        image = SimpleUploadedFile('edited.gif', self.small_gif,
+                                   content_type='image/gif')
+        with mock.patch('posts.views.redirect', side_effect=RuntimeError), \
+                self.assertLogs('django.request', 'ERROR'):
+            with self.assertRaises(RuntimeError):
+                self.authorized_client.post(
+                    url, {'text': 'Правка', 'image': image})
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(Post.objects.get(pk=self.post.pk).text, 'Text')
+
+    def test_author_downloads_zip_archive(self):
+        Comment.objects.create(post=self.post, author=self.user, text='Мой')
+        response = self.authorized_client.get(
+            reverse('posts:profile_export', args=[self.user.username]))
+        self.assertTrue(response.streaming)
+        self.assertIn('Petuh.zip', response['Content-Disposition'])
+        archive = zipfile.ZipFile(
+            io.BytesIO(b''.join(response.streaming_content)))
+        image = f'images/{self.post.image.name}'
+        self.assertEqual(
+            archive.namelist(), ['post.ndjson', 'comment.ndjson', image])
+        post = json.loads(archive.read('post.ndjson'))
+        self.assertEqual(post['text'], self.post.text)
+        self.assertEqual(post['author'], self.user.username)
+        self.assertEqual(archive.read(image), self.small_gif)
+
+    def test_author_downloads_ndjson_archive(self):
+        Comment.objects.create(post=self.post, author=self.user, text='Мой')
+        response = self.authorized_client.get(
+            reverse('posts:profile_export', args=[self.user.username]),
+            {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)['model'] for line in lines],
+            ['post', 'comment'])
+
+    def test_only_author_can_export(self):
+        url = reverse('posts:profile_export', args=[self.author.username])
+        response = self.authorized_client.get(url)
+        self.assertRedirects(
+            response, reverse('posts:profile', args=[self.author.username]))
+        response = self.guest_client.get(url)
+        self.assertRedirects(response, f'/auth/login/?next={url}')
+
     def test_about_author_page_for_guest(self):
         response = self.guest_client.get(reverse('about:author'))
         self.assertEqual(response.status_code, 200)
@@ -165,19 +298,43 @@ class PostPagesTest(TestCase):
         self.assertEqual(response.status_code, 200)
 
     def test_cache(self):
+        """Лента берётся из кэша, пока её не сбросит новая запись."""
         response_before = self.authorized_client.get(
             reverse('posts:index')).content
+        Post.objects.filter(pk=self.post.pk).update(text='без сигналов')
+        response_cached = self.authorized_client.get(
+            reverse('posts:index')).content
         Post.objects.create(
             text='test cache',
             author=self.user,
         )
         response_after = self.authorized_client.get(
             reverse('posts:index')).content
+        self.assertEqual(response_before, response_cached)
+        self.assertIn('test cache'.encode(), response_after)
+
+    def test_group_change_invalidates_group_and_index(self):
+        url = reverse('posts:group', kwargs={'slug': 'test-slug'})
+        self.authorized_client.get(url)
+        self.group.description = 'Новое описание'
+        self.group.save()
+        self.post.text = 'Новый текст'
+        self.post.group = self.another_group
+        self.post.save()
+        self.assertNotContains(self.authorized_client.get(url), 'Новый текст')
+        self.assertContains(self.authorized_client.get(reverse(
+            'posts:group', kwargs={'slug': 'another-test-slug'})),
+            'Новый текст')
+
+    def test_stale_fragment_served_while_another_request_refreshes(self):
         cache.clear()
-        response_without_cache = self.authorized_client.get(
-            reverse('posts:index')).content
-        self.assertEqual(response_before, response_after)
-        self.assertNotEqual(response_after, response_without_cache)
+        render = feed_cache.render
+        self.assertEqual(render('index', [1], lambda: 'old'), 'old')
+        feed_cache.bump('index')
+        cache.add(feed_cache.fragment_key('index', [1]) + ':lock', 1)
+        self.assertEqual(render('index', [1], lambda: 'new'), 'old')
+        cache.delete(feed_cache.fragment_key('index', [1]) + ':lock')
+        self.assertEqual(render('index', [1], lambda: 'new'), 'new')
 
     def test_user_can_subscribe(self):
         """Авторизованный пользователь может подписываться
@@ -258,6 +415,123 @@ class PostPagesTest(TestCase):
         self.assertEqual(comment.post, self.post)
         self.assertEqual(comment.author, self.user)
 
+    @override_settings(SITE_URL='https://yatube.example/')
+    def test_comment_notifies_post_author_by_email(self):
+        self.user.email = 'petuh@example.com'
+        self.user.save()
+        reader = Client()
+        reader.force_login(self.author)
+        reader.post(
+            reverse('posts:add_comment', args=['Petuh', self.post.id]),
+            {'text': 'Отличный пост'})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['petuh@example.com'])
+        self.assertIn('Отличный пост', mail.outbox[0].body)
+        self.assertIn(
+            f'https://yatube.example/Petuh/{self.post.id}/#comment_',
+            mail.outbox[0].body)
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=['Petuh', self.post.id]),
+            {'text': 'Сам себе'})
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class FollowTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.star = User.objects.create_user(username='star')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def feed(self, cursor=None):
+        url = reverse('posts:follow_index')
+        if cursor:
+            url += f'?cursor={cursor}'
+        return self.client.get(url).context['page']
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='fan-out', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        Post.objects.create(text='before follow', author=self.author)
+        self.client.get(reverse('posts:profile_follow', args=['writer']))
+        self.assertEqual(self.user.timeline.count(), 1)
+        self.client.get(reverse('posts:profile_unfollow', args=['writer']))
+        self.assertEqual(self.user.timeline.count(), 0)
+
+    @override_settings(JOBS_ASYNC=True)
+    def test_follow_backfills_in_background(self):
+        """Старые посты автора раскладывает задача, а не запрос подписки"""
+        for i in range(3):
+            Post.objects.create(text=f'до подписки {i}', author=self.author)
+        call_command('run_workers', processes=0, once=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('posts:profile_follow', args=['writer']))
+        self.assertEqual(self.user.timeline.count(), 0)
+        call_command('run_workers', processes=0, once=True)
+        self.assertEqual(self.user.timeline.count(), 3)
+
+    @override_settings(JOBS_ASYNC=True)
+    def test_backfill_after_unfollow_adds_nothing(self):
+        Post.objects.create(text='до подписки', author=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('posts:profile_follow', args=['writer']))
+            self.client.get(
+                reverse('posts:profile_unfollow', args=['writer']))
+        call_command('run_workers', processes=0, once=True)
+        self.assertEqual(self.user.timeline.count(), 0)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_merged_at_read_time(self):
+        Follow.objects.create(user=self.user, author=self.star)
+        cache.clear()
+        Follow.objects.create(user=self.user, author=self.author)
+        for i in range(6):
+            Post.objects.create(text=f'star {i}', author=self.star)
+            Post.objects.create(text=f'writer {i}', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.star).exists())
+        first = self.feed()
+        second = self.feed(first.next_cursor)
+        posts = list(first) + list(second)
+        self.assertEqual(len(posts), 12)
+        self.assertEqual(
+            posts, list(Post.objects.order_by('-pub_date', '-id')))
+        self.assertEqual(list(self.feed(second.previous_cursor)), list(first))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_crossing_fanout_limit_refreshes_timelines(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(text='до порога', author=self.author)
+        Follow.objects.create(user=self.star, author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.author).exists())
+        Post.objects.create(text='звезда', author=self.author)
+        Follow.objects.filter(user=self.star).delete()
+        self.assertEqual(
+            [post.text for post in self.feed()], ['звезда', 'до порога'])
+        self.assertEqual(self.user.timeline.count(), 2)
+
+    def test_suggestions_are_shown_on_profile_and_feed(self):
+        Suggestion.objects.create(user=self.user, author=self.star, score=3)
+        for url in (reverse('posts:follow_index'),
+                    reverse('posts:profile', args=['writer'])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    [row.author for row in response.context['suggestions']],
+                    [self.star])
+                self.assertContains(response, 'читают 3 из ваших подписок')
+
 
 class PaginatorViewsTest(TestCase):
 
@@ -278,6 +552,7 @@ class PaginatorViewsTest(TestCase):
             )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
 
     def test_index_first_page_contains_ten_records(self):
@@ -288,3 +563,335 @@ class PaginatorViewsTest(TestCase):
     def test_paginator_second_page(self):
         response = self.guest_client.get(reverse('posts:index') + '?page=2')
         self.assertEqual(len(response.context.get('page').object_list), 3)
+
+    def test_first_page_uses_cursor_without_count(self):
+        """Первая страница ленты не считает COUNT(*) и отдаёт курсор"""
+        with CaptureQueriesContext(connection) as queries:
+            page = self.guest_client.get(
+                reverse('posts:index')).context['page']
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] or 'OFFSET' in query['sql']
+            for query in queries))
+        self.assertEqual(len(page.object_list), 10)
+        self.assertIsNotNone(page.next_cursor)
+        self.assertIsNone(page.previous_cursor)
+
+    def test_cursor_next_and_previous(self):
+        """По курсорам можно пройти ленту вперёд и вернуться назад"""
+        first = self.guest_client.get(reverse('posts:index')).context['page']
+        second = self.guest_client.get(
+            reverse('posts:index') + f'?cursor={first.next_cursor}'
+        ).context['page']
+        self.assertEqual(len(second.object_list), 3)
+        self.assertIsNone(second.next_cursor)
+        self.assertEqual(
+            set(first.object_list) & set(second.object_list), set())
+        back = self.guest_client.get(
+            reverse('posts:index') + f'?cursor={second.previous_cursor}'
+        ).context['page']
+        self.assertEqual(list(back.object_list), list(first.object_list))
+        self.assertIsNone(back.previous_cursor)
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.guest_client.get(
+            reverse('posts:index') + '?cursor=broken')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page'].object_list), 10)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Вирусный', author=cls.author)
+        for i in range(views.COMMENTS_PER_PAGE + 5):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_post_page_shows_first_batch_newest_first(self):
+        response = self.guest_client.get(
+            reverse('posts:post', args=['author', self.post.id]))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), views.COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'Комментарий 24')
+        self.assertIsNotNone(comments.next_cursor)
+        self.assertContains(response, comments.next_cursor)
+
+    def test_fragment_returns_next_batch(self):
+        first = self.guest_client.get(
+            reverse('posts:post', args=['author', self.post.id]))
+        response = self.guest_client.get(
+            reverse('posts:post_comments', args=['author', self.post.id]),
+            {'cursor': first.context['comments'].next_cursor})
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Комментарий {i}' for i in range(4, -1, -1)])
+        self.assertIsNone(comments.next_cursor)
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_feed_card_shows_stored_comment_count(self):
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(
+            response, f'Комментариев: {views.COMMENTS_PER_PAGE + 5}')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Ещё один')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(
+            response, f'Комментариев: {views.COMMENTS_PER_PAGE + 6}')
+
+    def test_new_comment_keeps_feed_fragment(self):
+        """Число комментариев подставляется в закэшированный фрагмент."""
+        client = Client()
+        client.force_login(self.author)
+        client.get(reverse('posts:index'))
+        scopes = ('index', feed_cache.scope_of(self.author))
+        generations = feed_cache.generations(*scopes)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Ещё один')
+        response = client.get(reverse('posts:index'))
+        self.assertContains(
+            response, f'Комментариев: {views.COMMENTS_PER_PAGE + 6}')
+        self.assertEqual(feed_cache.generations(*scopes), generations)
+
+    def test_fragment_of_unknown_post(self):
+        response = self.guest_client.get(
+            reverse('posts:post_comments', args=['nobody', self.post.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryCountTest(TestCase):
+    """Число запросов у лент не зависит от числа постов и комментариев."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.authors = []
+        for i in range(3):
+            author = User.objects.create_user(username=f'author{i}')
+            Follow.objects.create(user=cls.reader, author=author)
+            cls.authors.append(author)
+        cls.post = cls.add_posts(1)
+
+    @classmethod
+    def add_posts(cls, per_author):
+        for author in cls.authors:
+            for _ in range(per_author):
+                post = Post.objects.create(
+                    text='Текст', author=author, group=cls.group)
+                Comment.objects.create(
+                    post=post, author=cls.reader, text='Комментарий')
+        return post
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def assertQueriesStayFixed(self, url, num):
+        with self.assertNumQueries(num):
+            self.client.get(url)
+        self.add_posts(3)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=author, text='Ещё')
+            for author in self.authors)
+        cache.clear()
+        with self.assertNumQueries(num):
+            self.client.get(url)
+
+    def test_index(self):
+        self.assertQueriesStayFixed(reverse('posts:index'), 3)
+
+    def test_group_posts(self):
+        self.assertQueriesStayFixed(
+            reverse('posts:group', args=[self.group.slug]), 4)
+
+    def test_profile(self):
+        author = self.post.author.username
+        self.assertQueriesStayFixed(reverse('posts:profile', args=[author]), 6)
+
+    def test_post_view(self):
+        self.assertQueriesStayFixed(reverse(
+            'posts:post', args=[self.post.author.username, self.post.id]), 4)
+
+    def test_follow_index(self):
+        self.assertQueriesStayFixed(reverse('posts:follow_index'), 5)
+
+    def test_follow_checks_use_followee_cache(self):
+        author = self.post.author.username
+        self.client.get(reverse('posts:profile', args=[author]))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:profile', args=[author]))
+            self.client.get(reverse('posts:profile_follow', args=[author]))
+        self.assertFalse(any('"posts_follow"' in query['sql']
+                             for query in queries.captured_queries))
+        self.client.get(reverse('posts:profile_unfollow', args=[author]))
+        response = self.client.get(reverse('posts:profile', args=[author]))
+        self.assertFalse(response.context['following'])
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Текст', author=cls.author)
+        cls.post_url = reverse('posts:post', args=['author', cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_repeat_request_is_served_without_queries(self):
+        first = self.guest_client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            second = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_conditional_get_returns_not_modified(self):
+        response = self.guest_client.get(self.post_url)
+        with self.assertNumQueries(0):
+            by_etag = self.guest_client.get(
+                self.post_url, HTTP_IF_NONE_MATCH=response['ETag'])
+            by_date = self.guest_client.get(
+                self.post_url,
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(by_etag.status_code, 304)
+        self.assertEqual(by_date.status_code, 304)
+
+    def test_comment_invalidates_post_page(self):
+        etag = self.guest_client.get(self.post_url)['ETag']
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Новый комментарий')
+        response = self.guest_client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_edit_is_not_hidden_by_last_modified(self):
+        """Правка не меняет даты записей, но страница уже другая"""
+        modified = self.guest_client.get(self.post_url)['Last-Modified']
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        self.guest_client.get(self.post_url)
+        response = self.guest_client.get(
+            self.post_url, HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Исправленный текст')
+
+    def test_authorized_user_bypasses_page_cache(self):
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('ETag'))
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.match = Post.objects.create(
+            text='Ёжик и котики в тумане', author=cls.author)
+        cls.better = Post.objects.create(
+            text='Котики, котики и ещё раз котики', author=cls.author)
+        Post.objects.create(text='Про собак', author=cls.author)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, cursor=None):
+        params = {'q': query}
+        if cursor:
+            params['cursor'] = cursor
+        return self.guest_client.get(
+            reverse('posts:search'), params).context['page']
+
+    def test_results_are_ranked_and_match_word_forms(self):
+        """Слово ищется как префикс, лучшее совпадение первым"""
+        self.assertEqual(
+            list(self.search('КОТИК')), [self.better, self.match])
+
+    def test_yo_is_same_as_ye(self):
+        self.assertEqual(list(self.search('ежик')), [self.match])
+
+    def test_index_follows_edit_and_delete(self):
+        self.match.text = 'Теперь про собак'
+        self.match.save()
+        self.assertEqual(list(self.search('ёжик')), [])
+        self.assertEqual(len(self.search('собак')), 2)
+        self.better.delete()
+        self.assertEqual(list(self.search('котики')), [])
+
+    def test_fts_syntax_in_query_is_ignored(self):
+        page = self.search('(котики" -')
+        self.assertEqual(len(page), 2)
+        self.assertEqual(list(self.search('')), [])
+
+    def test_keyset_pagination(self):
+        for i in range(12):
+            Post.objects.create(text=f'туман {i}', author=self.author)
+        first = self.search('туман')
+        second = self.search('туман', first.next_cursor)
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 3)
+        self.assertEqual(set(first) & set(second), set())
+        self.assertIsNone(second.next_cursor)
+        back = self.search('туман', second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_pages_keep_ranking_of_first_page(self):
+        """Новые посты не сдвигают ранги страниц, которые уже листают"""
+        posts = [Post.objects.create(
+            text='роса ' + 'и лес ' * i, author=self.author)
+            for i in range(12)]
+        first = self.search('роса')
+        # bm25 зависит от всего индекса: новые посты меняют все ранги.
+        Post.objects.bulk_create(
+            Post(text=f'роса роса {i}', author=self.author)
+            for i in range(5))
+        Post.objects.bulk_create(
+            Post(text=f'про лес {i}', author=self.author) for i in range(20))
+        Post.objects.create(text='роса', author=self.author)
+        second = self.search('роса', first.next_cursor)
+        self.assertEqual(list(first) + list(second), posts)
+        back = self.search('роса', second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_repeated_search_reuses_ranking(self):
+        self.search('котик')
+        with CaptureQueriesContext(connection) as queries:
+            self.search('котик')
+        self.assertFalse([query for query in queries
+                          if 'bm25' in query['sql']])
+
+    @override_settings(SEARCH_RESULTS_LIMIT=3)
+    def test_ranking_keeps_only_best_results(self):
+        for i in range(5):
+            Post.objects.create(text=f'туман {i}', author=self.author)
+        self.assertEqual(len(self.search('туман')), 3)
+
+    def test_numbered_pages_are_ranked(self):
+        posts = [Post.objects.create(
+            text='роса ' + 'и лес ' * i, author=self.author)
+            for i in range(12)]
+        pages = [self.guest_client.get(
+            reverse('posts:search'), {'q': 'роса', 'page': number}
+        ).context['page'] for number in (1, 2)]
+        self.assertEqual(pages[0].paginator.num_pages, 2)
+        self.assertEqual(list(pages[0]) + list(pages[1]), posts)
+
+    def test_expired_snapshot_starts_over(self):
+        for i in range(12):
+            Post.objects.create(text=f'туман {i}', author=self.author)
+        first = self.search('туман')
+        cache.clear()
+        again = self.search('туман', first.next_cursor)
+        self.assertEqual(list(again), list(first))
+        self.assertFalse(again.has_previous())
@@ -0,0 +1,124 @@
+"""Миниатюры картинок постов, подготовленные заранее.
+
+{% thumbnail %} из sorl при первом показе декодирует и масштабирует оригинал
+прямо во время рендера. Здесь миниатюры нужных шаблонам размеров
+(POST_THUMBNAILS) создаются фоновой задачей после сохранения поста, а
+вьюхи только ищут готовые миниатюры всей страницы одним запросом к
+key-value store sorl (prefetch). Пока миниатюры нет, карточка показывает
+оригинал; когда задача её создаст, сигнал thumbnails_ready сбрасывает
+кэшированные ленты с этой картинкой.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.dispatch import Signal
+from django.utils.functional import SimpleLazyObject
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from . import jobs, worker
+
+logger = logging.getLogger(__name__)
+
+# Миниатюры картинки name созданы; аргумент name.
+thumbnails_ready = Signal()
+
+
+def thumbnail_file(image, geometry, **options):
+    """ImageFile миниатюры с тем же именем, что даёт get_thumbnail()."""
+    backend = default.backend
+    source = ImageFile(image)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def cached_thumbnails(images, geometry, **options):
+    """Готовые миниатюры картинок {имя: ImageFile} без масштабирования.
+
+    Все ключи читаются одним get_many из кэша sorl, промахи — одним
+    запросом к таблице KVStore; отсутствующих миниатюр в ответе нет.
+    """
+    keys = {
+        add_prefix(thumbnail_file(image, geometry, **options).key): image.name
+        for image in images if image
+    }
+    if not keys:
+        return {}
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(KVStore.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        fetched = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in values.items() if value != EMPTY_VALUE
+    }
+
+
+def prefetch(page, name='card'):
+    """Готовит post.thumbnail для всех постов страницы.
+
+    Миниатюры читаются лениво и разом для всей страницы при первом
+    обращении, поэтому закэшированный фрагмент ленты не стоит ни одного
+    запроса. Принимает Page или список постов.
+    """
+    if hasattr(page, 'object_list'):
+        page.object_list = list(page.object_list)
+        posts = page.object_list
+    else:
+        posts = list(page)
+    geometry, options = settings.POST_THUMBNAILS[name]
+    found = {}
+
+    def lookup(post):
+        if not found:
+            found.update(cached_thumbnails(
+                [post.image for post in posts], geometry, **options))
+            found.setdefault(None, None)
+        return found.get(post.image.name) if post.image else None
+
+    for post in posts:
+        post.thumbnail = SimpleLazyObject(lambda post=post: lookup(post))
+    return page
+
+
+@jobs.task
+def generate(name):
+    """Создаёт все миниатюры из POST_THUMBNAILS для картинки name."""
+    created = 0
+    for geometry, options in settings.POST_THUMBNAILS.values():
+        try:
+            get_thumbnail(name, geometry, **options)
+            created += 1
+        except Exception:
+            logger.warning('Не удалось создать миниатюру %s для %s',
+                           geometry, name, exc_info=True)
+    if created:
+        thumbnails_ready.send(sender=generate, name=name)
+    return created
+
+
+def pool(max_workers=None):
+    """Пул процессов для масштабирования; в дочерних процессах свой Django."""
+    return ProcessPoolExecutor(
+        max_workers=max_workers or settings.THUMBNAIL_WORKERS,
+        mp_context=get_context('spawn'), initializer=worker.init)
@@ -0,0 +1,205 @@
+"""Материализованная лента «Избранные авторы».
+
+Новый пост раскладывается по лентам подписчиков (fan-out on write), поэтому
+follow_index читает одну таблицу TimelineEntry по индексу. Авторы, у которых
+подписчиков больше TIMELINE_FANOUT_LIMIT, не раскладываются: их посты
+подмешиваются в ленту при чтении (гибридный режим). Когда автор
+пересекает порог, refresh_author раскладывает его посты заново или
+убирает ненужные теперь записи.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+
+from . import follow_graph, jobs
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginator import PREVIOUS, CursorPaginator
+
+CELEBRITIES_CACHE_KEY = 'timeline:celebrities'
+ENTRY_KEY_FIELDS = ('pub_date', 'post_id')
+
+MATERIALIZE_SQL = """
+INSERT INTO posts_timelineentry (user_id, post_id, author_id, pub_date)
+SELECT f.user_id, p.id, p.author_id, p.pub_date
+FROM posts_follow f JOIN posts_post p ON p.author_id = f.author_id
+WHERE f.id BETWEEN %s AND %s AND f.author_id NOT IN (
+    SELECT user_id FROM posts_authorstats WHERE followers_count > %s)
+ON CONFLICT DO NOTHING
+"""
+
+MATERIALIZE_AUTHOR_SQL = """
+INSERT INTO posts_timelineentry (user_id, post_id, author_id, pub_date)
+SELECT f.user_id, p.id, p.author_id, p.pub_date
+FROM posts_follow f JOIN posts_post p ON p.author_id = f.author_id
+WHERE f.author_id = %s
+ON CONFLICT DO NOTHING
+"""
+
+
+def celebrity_ids():
+    """Авторы, посты которых подмешиваются при чтении, а не раскладываются."""
+    ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if ids is None:
+        ids = frozenset(AuthorStats.objects.filter(
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+        ).values_list('user_id', flat=True))
+        cache.set(CELEBRITIES_CACHE_KEY, ids,
+                  settings.TIMELINE_CELEBRITIES_TIMEOUT)
+    return ids
+
+
+@jobs.task
+def fan_out(post_id):
+    """Раскладывает пост по лентам всех подписчиков автора."""
+    post = Post.objects.filter(pk=post_id).values(
+        'id', 'author_id', 'pub_date').first()
+    if post is None or post['author_id'] in celebrity_ids():
+        return
+    followers = Follow.objects.filter(
+        author_id=post['author_id']).values_list('user_id', flat=True)
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post['id'],
+                      author_id=post['author_id'], pub_date=post['pub_date'])
+        for user_id in followers.iterator(
+            chunk_size=settings.TIMELINE_BATCH_SIZE)
+    )
+
+
+@jobs.task
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора.
+
+    У плодовитого автора это много строк, поэтому вызывается через очередь
+    задач, а не в запросе подписки.
+    """
+    if author_id in celebrity_ids():
+        return
+    # Пока задача ждала очереди, пользователь мог отписаться.
+    if not Follow.objects.filter(
+            user_id=user_id, author_id=author_id).exists():
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date')
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator(
+            chunk_size=settings.TIMELINE_BATCH_SIZE)
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def followers_changed(author_id, delta):
+    """Следит за пересечением TIMELINE_FANOUT_LIMIT после сдвига счётчика
+    подписчиков автора на delta (сигналы Follow).
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    count = AuthorStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first()
+    if count != (limit + 1 if delta > 0 else limit):
+        return
+    cache.delete(CELEBRITIES_CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(CELEBRITIES_CACHE_KEY))
+    jobs.enqueue(refresh_author, author_id)
+
+
+@jobs.task
+def refresh_author(author_id):
+    """Приводит ленты подписчиков автора в соответствие с его статусом.
+
+    Посты «звезды» подмешиваются при чтении, и её записи в лентах только
+    занимают место. Автор, переставший быть «звездой», раскладывается
+    заново: его посты за это время и подписки без backfill в лентах
+    отсутствуют.
+    """
+    if author_id in celebrity_ids():
+        TimelineEntry.objects.filter(author_id=author_id).delete()
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(MATERIALIZE_AUTHOR_SQL, [author_id])
+
+
+def materialize(follow_ids, chunk_size):
+    """Раскладывает посты авторов по лентам для подписок из follow_ids.
+
+    Для данных, вставленных через bulk_create мимо сигналов: одна вставка
+    INSERT ... SELECT на каждые chunk_size подписок, уже разложенное
+    пропускается. follow_ids — возрастающие id подписок (список или range);
+    счётчики AuthorStats должны быть актуальны, чтобы не раскладывать посты
+    «звёзд».
+    """
+    for start in range(0, len(follow_ids), chunk_size):
+        chunk = follow_ids[start:start + chunk_size]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(MATERIALIZE_SQL, [
+                chunk[0], chunk[-1], settings.TIMELINE_FANOUT_LIMIT])
+
+
+def _insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == settings.TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок: материализованные записи плюс посты «звёзд».
+
+    По курсору обе части читаются окнами по индексу и сливаются по
+    (pub_date, id). Для старых ссылок ?page=N и подсчётов object_list
+    остаётся эквивалентным запросом к Post.
+    """
+
+    def __init__(self, user, per_page, **kwargs):
+        self.celebrities = []
+        if celebrity_ids():
+            self.celebrities = sorted(
+                follow_graph.follows_many(user.id, celebrity_ids()))
+        self.entries = self.order(
+            TimelineEntry.objects.filter(user=user)
+            .exclude(author_id__in=self.celebrities)
+            .select_related('post__author', 'post__group'),
+            ENTRY_KEY_FIELDS
+        )
+        posts = Post.objects.filter(
+            Q(id__in=self.entries.values('post_id'))
+            | Q(author_id__in=self.celebrities)
+        ).select_related('author', 'group')
+        super().__init__(posts, per_page, **kwargs)
+
+    def windows(self, direction, key):
+        """Окна записей ленты и постов «звёзд» после позиции key."""
+        windows = [self.window(self.entries, direction, key, ENTRY_KEY_FIELDS)]
+        if self.celebrities:
+            windows.append(self.window(
+                self.order(Post.objects.filter(
+                    author_id__in=self.celebrities
+                ).select_related('author', 'group')),
+                direction, key))
+        return windows
+
+    def merge(self, direction, entries, posts=()):
+        rows = [entry.post for entry in entries] + list(posts)
+        if posts:
+            rows.sort(key=lambda post: (post.pub_date, post.pk),
+                      reverse=direction != PREVIOUS)
+        return rows[:self.per_page + 1]
+
+    def fetch(self, direction, key):
+        return self.merge(direction, *(
+            list(window) for window in self.windows(direction, key)))
+
+    async def afetch(self, direction, key):
+        rows = []
+        for window in self.windows(direction, key):
+            rows.append([row async for row in window])
+        return self.merge(direction, *rows)
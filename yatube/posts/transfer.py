@@ -0,0 +1,232 @@
+"""Потоковые экспорт и импорт данных сайта в NDJSON.
+
+dumpdata и loaddata держат весь набор в памяти. Здесь каждая модель пишется
+в свой файл <модель>.ndjson, по строке JSON на объект: экспорт читает базу
+через iterator(), импорт читает файл построчно и вставляет порциями через
+bulk_create, поэтому память не зависит от объёма. Пользователи передаются
+по username; недостающих импорт создаёт с непригодным паролем.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_datetime
+
+from . import stats, timeline
+from .models import Comment, Follow, Group, Post
+from .seed import explicit_dates
+
+User = get_user_model()
+
+MODELS = {
+    'group': (Group, ('id', 'title', 'slug', 'description')),
+    'post': (Post, ('id', 'text', 'pub_date', 'author', 'group', 'image')),
+    'comment': (Comment, ('id', 'post', 'author', 'text', 'created')),
+    'follow': (Follow, ('id', 'user', 'author')),
+}
+DATE_FIELDS = {'post': 'pub_date', 'comment': 'created'}
+# Модели одного этапа не ссылаются друг на друга и могут грузиться
+# параллельно; этапы идут по порядку внешних ключей.
+STAGES = (('group', 'follow'), ('post',), ('comment',))
+
+
+class Encoder(DjangoJSONEncoder):
+    """Даты с микросекундами: DjangoJSONEncoder обрезает их до мс."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def path_for(directory, name):
+    return os.path.join(directory, f'{name}.ndjson')
+
+
+def _user_fields(model, fields):
+    return {
+        name for name in fields
+        if name != 'id' and model._meta.get_field(name).related_model is User
+    }
+
+
+def rows(name, queryset=None, chunk_size=2000):
+    """Объекты модели (или queryset) словарями в формате NDJSON-файлов."""
+    model, fields = MODELS[name]
+    users = _user_fields(model, fields)
+    columns = [f'{field}__username' if field in users else field
+               for field in fields]
+    if queryset is None:
+        queryset = model.objects.all()
+    values = queryset.order_by('pk').values_list(*columns)
+    for row in values.iterator(chunk_size=chunk_size):
+        yield dict(zip(fields, row))
+
+
+def encode(row):
+    """Строка NDJSON с переводом строки."""
+    return json.dumps(row, cls=Encoder, ensure_ascii=False) + '\n'
+
+
+def export_model(name, file, chunk_size=2000):
+    """Пишет объекты модели в file; возвращает их число."""
+    count = 0
+    for row in rows(name, chunk_size=chunk_size):
+        file.write(encode(row))
+        count += 1
+    return count
+
+
+def _user_ids(usernames):
+    """{username: id}; недостающие пользователи создаются."""
+    found = dict(User.objects.filter(
+        username__in=usernames).values_list('username', 'id'))
+    missing = set(usernames) - set(found)
+    if missing:
+        User.objects.bulk_create(
+            [User(username=username, password=make_password(None))
+             for username in missing],
+            ignore_conflicts=True)
+        found.update(User.objects.filter(
+            username__in=missing).values_list('username', 'id'))
+    return found
+
+
+def _insert(name, batch, ignore_conflicts):
+    model, fields = MODELS[name]
+    users = _user_fields(model, fields)
+    ids = _user_ids({row[field] for row in batch for field in users})
+    objects = []
+    for row in batch:
+        attrs = {}
+        for field in fields:
+            value = row.get(field)
+            if field in users:
+                value = ids[value]
+            elif field == DATE_FIELDS.get(name):
+                value = parse_datetime(value)
+            attrs[model._meta.get_field(field).attname] = value
+        objects.append(model(**attrs))
+    with transaction.atomic():
+        model.objects.bulk_create(objects, ignore_conflicts=ignore_conflicts)
+
+
+def import_model(name, file, chunk_size=2000, ignore_conflicts=False):
+    """Загружает объекты модели из file порциями; возвращает их число."""
+    batch, count = [], 0
+    date_field = DATE_FIELDS.get(name)
+    with explicit_dates(MODELS[name][0], date_field) if date_field else (
+            nullcontext()):
+        for line in file:
+            if not line.strip():
+                continue
+            batch.append(json.loads(line))
+            if len(batch) == chunk_size:
+                _insert(name, batch, ignore_conflicts)
+                count += len(batch)
+                batch = []
+        if batch:
+            _insert(name, batch, ignore_conflicts)
+            count += len(batch)
+    return count
+
+
+def _timed(function, name, *args, **kwargs):
+    started = time.monotonic()
+    count = function(name, *args, **kwargs)
+    return name, count, time.monotonic() - started
+
+
+def export_all(directory, names, chunk_size=2000, log=print):
+    """Пишет каждую модель из names в свой файл; возвращает общее число."""
+    os.makedirs(directory, exist_ok=True)
+    total = 0
+    for name in names:
+        with open(path_for(directory, name), 'w', encoding='utf-8') as file:
+            result = _timed(export_model, name, file, chunk_size)
+        log(_report(*result))
+        total += result[1]
+    return total
+
+
+def _load(name, directory, chunk_size, ignore_conflicts):
+    with open(path_for(directory, name), encoding='utf-8') as file:
+        return import_model(name, file, chunk_size, ignore_conflicts)
+
+
+def _load_in_thread(name, *args):
+    try:
+        return _timed(_load, name, *args)
+    finally:
+        # У каждого потока своё соединение, закрываем его сами.
+        connection.close()
+
+
+def import_all(directory, names, chunk_size=2000, workers=1,
+               ignore_conflicts=False, timelines=True, log=print):
+    """Загружает модели по этапам STAGES; возвращает общее число.
+
+    Внешние ключи проверяются один раз в конце, как в loaddata. SQLite
+    допускает только одного писателя, поэтому на нём модели этапа грузятся
+    по очереди; на других СУБД — в workers потоков.
+    """
+    parallel = workers > 1 and connection.vendor != 'sqlite'
+    loaded = [name for stage in STAGES for name in stage if name in names]
+    total = 0
+    with connection.constraint_checks_disabled():
+        for stage in STAGES:
+            stage = [name for name in stage if name in names]
+            args = (directory, chunk_size, ignore_conflicts)
+            if parallel and len(stage) > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(
+                        lambda name: _load_in_thread(name, *args), stage))
+            else:
+                results = [_timed(_load, name, *args) for name in stage]
+            for result in results:
+                log(_report(*result))
+                total += result[1]
+    models = [MODELS[name][0] for name in loaded]
+    started = time.monotonic()
+    connection.check_constraints(
+        table_names=[model._meta.db_table for model in models])
+    _reset_sequences(models)
+    log(f'Проверка ключей: {time.monotonic() - started:.1f} с')
+    started = time.monotonic()
+    _refresh_derived(chunk_size, timelines)
+    log(f'Счётчики и ленты: {time.monotonic() - started:.1f} с')
+    return total
+
+
+def _reset_sequences(models):
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def _refresh_derived(chunk_size, timelines):
+    """Счётчики, ленты и кэш: bulk_create не шлёт сигналов."""
+    stats.rebuild(chunk_size=chunk_size)
+    stats.reconcile_comment_counts(chunk_size=chunk_size)
+    bounds = Follow.objects.aggregate(first=Min('pk'), last=Max('pk'))
+    if timelines and bounds['first'] is not None:
+        timeline.materialize(
+            range(bounds['first'], bounds['last'] + 1), chunk_size)
+    cache.clear()
+
+
+def _report(name, count, elapsed):
+    rate = count / elapsed if elapsed else 0
+    return f'{name}: {count} за {elapsed:.1f} с ({rate:.0f} в секунду)'
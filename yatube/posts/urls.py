@@ -1,18 +1,27 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
+
+# Страницы чтения: async-версии под ASGI, иначе синхронные.
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
 
 app_name = 'posts'
 urlpatterns = [
-    path('', views.index, name='index'),
+    path('', read_views.index, name='index'),
     path('new/', views.new_post, name='new_post'),
-    path('follow/', views.follow_index, name='follow_index'),
-    path('<str:username>/', views.profile, name='profile'),
-    path('<str:username>/<int:post_id>/', views.post_view, name='post'),
+    path('follow/', read_views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path('<str:username>/', read_views.profile, name='profile'),
+    path('<str:username>/<int:post_id>/', read_views.post_view, name='post'),
+    path(
+        '<str:username>/<int:post_id>/comments/', views.post_comments,
+        name='post_comments'
+    ),
     path(
         '<str:username>/<int:post_id>/edit/', views.post_edit, name='post_edit'
     ),
-    path('group/<slug:slug>/', views.group_posts, name='group'),
+    path('group/<slug:slug>/', read_views.group_posts, name='group'),
     path(
         '<username>/<int:post_id>/comment', views.add_comment,
         name='add_comment'
@@ -24,4 +33,8 @@ urlpatterns = [
         '<str:username>/unfollow/', views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path(
+        '<str:username>/export/', views.profile_export,
+        name='profile_export'
+    ),
 ]
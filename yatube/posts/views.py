@@ -1,36 +1,108 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import (archive, follow_graph, jobs, notifications, stats,
+               suggestions, thumbnails)
 from .forms import CommentForm, PostForm
 from .models import Comment, Follow, Group, Post
+from .page_cache import cache_anonymous_page
+from .paginator import CommentPaginator, CursorPaginator, get_page
+from .search import SearchPaginator
+from .timeline import TimelinePaginator
 
 User = get_user_model()
 
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
 
-def index(request):
-    latest = Post.objects.all()
-    paginator = Paginator(latest, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+
+def feed(queryset):
+    """Паджинатор ленты: посты вместе с автором и группой."""
+    return CursorPaginator(
+        queryset.select_related('author', 'group'), POSTS_PER_PAGE)
+
+
+def comment_paginator(post_id):
+    comments = Comment.objects.filter(post=post_id).select_related('author')
+    return CommentPaginator(comments, COMMENTS_PER_PAGE)
+
+
+def comments_page(request, post_id):
+    """Порция комментариев поста по курсору из ?cursor=."""
+    return comment_paginator(post_id).get_cursor_page(
+        request.GET.get('cursor'))
+
+
+# Отрисовка страниц общая для синхронных вьюх и async_views: данные
+# собраны заранее, остальное (миниатюры, фрагменты кэша) читается лениво.
+
+def render_index(request, page):
     return render(
         request,
         'index.html',
-        {'page': page, }
+        {'page': thumbnails.prefetch(page), }
     )
 
 
+def render_group(request, group, page):
+    return render(request, 'group.html', {
+        'group': group, 'page': thumbnails.prefetch(page)})
+
+
+def render_profile(request, author, following, page):
+    author_stats = stats.for_author(author)
+    return render(request, 'profile.html', {
+        'user': request.user,
+        'author': author,
+        'stats': author_stats,
+        'page': thumbnails.prefetch(page),
+        'count_posts': author_stats.posts_count,
+        'following': following,
+        'suggestions': suggestions.for_user(request.user),
+    })
+
+
+def render_post(request, post, comments):
+    thumbnails.prefetch([post])
+    author = post.author
+    author_stats = stats.for_author(author)
+    return render(request, 'post.html', {
+        'author': author,
+        'stats': author_stats,
+        'count_posts': author_stats.posts_count,
+        'post': post,
+        'comments': comments,
+        'form': CommentForm()
+    })
+
+
+def render_follow(request, page):
+    page = thumbnails.prefetch(page)
+    context = {
+        'page': page,
+        'paginator': page.paginator,
+        'page_number': page.number,
+        'suggestions': suggestions.for_user(request.user),
+    }
+    return render(request, 'follow.html', context)
+
+
+@cache_anonymous_page('index')
+def index(request):
+    return render_index(request, get_page(request, feed(Post.objects)))
+
+
+@cache_anonymous_page('group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'group.html', {'group': group, 'page': page})
+    return render_group(request, group, get_page(request, feed(group.posts)))
 
 
 @login_required
+@transaction.atomic
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
@@ -41,41 +113,37 @@ def new_post(request):
     return redirect('posts:index')
 
 
+@cache_anonymous_page('user:{username}')
 def profile(request, username):
-    user = request.user
-    author = get_object_or_404(User, username=username)
-    following = Follow.objects.filter(
-        author=author.id, user=request.user.id).exists()
-    posts = author.posts.all()
-    count_posts = posts.count()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'profile.html', {
-        'user': user,
-        'author': author,
-        'page': page,
-        'count_posts': count_posts,
-        'following': following
-    })
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    following = follow_graph.follows(request.user.id, author.id)
+    page = get_page(request, feed(author.posts))
+    return render_profile(request, author, following, page)
 
 
+@cache_anonymous_page('user:{username}', 'post:{post_id}')
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
-    form = CommentForm()
-    comments = Comment.objects.filter(post=post_id)
-    author = post.author
-    count_posts = author.posts.count()
-    return render(request, 'post.html', {
-        'author': author,
-        'count_posts': count_posts,
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats'),
+        author__username=username, id=post_id)
+    return render_post(request, post, comments_page(request, post_id))
+
+
+@cache_anonymous_page('user:{username}', 'post:{post_id}')
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев HTML-фрагментом для кнопки «ещё»."""
+    post = get_object_or_404(
+        Post.objects.select_related('author'),
+        author__username=username, id=post_id)
+    return render(request, 'includes/comment_list.html', {
         'post': post,
-        'comments': comments,
-        'form': form
+        'comments': comments_page(request, post_id),
     })
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, username, post_id):
     author = get_object_or_404(User, username=username)
     post = get_object_or_404(Post, author=author, id=post_id)
@@ -107,6 +175,7 @@ def server_error(request):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
     form = CommentForm(request.POST or None)
@@ -115,33 +184,53 @@ def add_comment(request, username, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        jobs.enqueue(notifications.comment_notification, comment.pk)
     return redirect('posts:post', username=username, post_id=post_id)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page = thumbnails.prefetch(get_page(
+        request, SearchPaginator(query, POSTS_PER_PAGE)))
+    return render(request, 'search.html', {'query': query, 'page': page})
+
+
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {
-        'page': page,
-        'paginator': paginator,
-        'page_number': page_number
-    }
-    return render(request, 'follow.html', context)
+    return render_follow(request, get_page(
+        request, TimelinePaginator(request.user, POSTS_PER_PAGE)))
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    if user != author:
+    # Повторная подписка не идёт в базу: кэш подписок уже её знает.
+    if user != author and not follow_graph.follows(user.id, author.id):
         Follow.objects.get_or_create(user=user, author=author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
+def profile_export(request, username):
+    if request.user.username != username:
+        return redirect('posts:profile', username=username)
+    if request.GET.get('format') == 'ndjson':
+        response = StreamingHttpResponse(
+            archive.ndjson_stream(request.user),
+            content_type='application/x-ndjson')
+        filename = f'{username}.ndjson'
+    else:
+        response = StreamingHttpResponse(
+            archive.zip_stream(request.user), content_type='application/zip')
+        filename = f'{username}.zip'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     user = request.user
     author = User.objects.get(username=username)
@@ -0,0 +1,27 @@
+"""Точка входа процессов пула (run_workers, generate_thumbnails).
+
+Процессы запускаются через spawn и импортируют этот модуль до
+django.setup(), поэтому здесь нет импортов моделей на уровне модуля.
+"""
+import django
+
+
+def init():
+    django.setup()
+
+
+def execute(name, args):
+    """jobs.execute() в процессе пула; соединения закрываются после задачи."""
+    from django.db import connections
+
+    from . import jobs
+    try:
+        return jobs.execute(name, args)
+    finally:
+        # Между задачами процесс может долго простаивать.
+        connections.close_all()
+
+
+def generate_thumbnails(name):
+    from . import thumbnails
+    return thumbnails.generate(name)
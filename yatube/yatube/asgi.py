@@ -0,0 +1,23 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+
+from yatube.asgi_handler import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+# Под ASGI ленты и страницы поста отдают async-вьюхи.
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
+
+# Как django.core.asgi.get_asgi_application, но потоковые ответы
+# (архив автора) читают базу вне цикла событий.
+django.setup(set_prefix=False)
+application = ASGIHandler()
@@ -0,0 +1,44 @@
+"""ASGI-обработчик, который отдаёт потоковые ответы из потока.
+
+Django 4.1 перебирает StreamingHttpResponse прямо в цикле событий, а
+генераторы архива (posts.archive) читают базу, и ORM падает с
+SynchronousOnlyOperation. Здесь каждый следующий кусок берётся через
+sync_to_async в том же потоке, где работала синхронная вьюха; память
+по-прежнему не зависит от размера ответа.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+
+_DONE = object()
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append(
+                (b'Set-Cookie', c.output(header='').encode('ascii').strip()))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        while (part := await next_part(parts, _DONE)) is not _DONE:
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
@@ -0,0 +1,349 @@
+"""Метрики вьюх для Prometheus: задержка, запросы к базе, шаблоны, размер.
+
+metrics_middleware записывает по имени маршрута (posts:index, api:posts)
+число ответов, гистограммы задержки и размера ответа, число и время
+запросов к базе и время отрисовки шаблонов. Запросы к базе считает обёртка
+execute_wrapper (она же передаёт запросы в yatube/query_log.py), шаблоны —
+бэкенд DjangoTemplates из этого модуля; оба находят текущий запрос через
+contextvar, поэтому работают и в потоках sync_to_async у async-вьюх.
+
+Агрегаты без блокировок: у каждого потока свой словарь, в который пишет
+только он. Раз в METRICS_FLUSH_INTERVAL секунд процесс сохраняет сумму по
+своим потокам в METRICS_DIR/<pid>-<время старта>.json (запись во временный
+файл и os.replace), а /metrics складывает файлы всех воркеров на машине.
+Счётчики умерших процессов остаются в файлах, как и положено счётчикам:
+время старта в имени не даёт новому процессу с тем же pid затереть файл
+прежнего. Каталог стоит очищать при выкладке.
+"""
+import asyncio
+import atexit
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from glob import glob
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends import django as django_backend
+from django.utils.decorators import sync_and_async_middleware
+
+from yatube import query_log
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = tuple(2 ** power for power in range(8, 23, 2))
+
+# Имя: (тип, описание, границы гистограммы).
+METRICS = {
+    'yatube_http_requests_total': (
+        'counter', 'Ответы по маршруту, методу и статусу.', None),
+    'yatube_http_request_duration_seconds': (
+        'histogram', 'Время ответа вьюхи.', DURATION_BUCKETS),
+    'yatube_http_response_size_bytes': (
+        'histogram', 'Размер тела ответа (кроме потоковых).', SIZE_BUCKETS),
+    'yatube_db_queries_total': (
+        'counter', 'Запросы к базе во время ответа.', None),
+    'yatube_db_query_seconds_total': (
+        'counter', 'Время запросов к базе во время ответа.', None),
+    'yatube_template_render_seconds_total': (
+        'counter', 'Время отрисовки шаблонов во время ответа.', None),
+    # Узлы шаблонов, при TEMPLATE_PROFILING (yatube/template_profiler.py).
+    'yatube_template_node_renders_total': (
+        'counter', 'Отрисовки узла шаблона.', None),
+    'yatube_template_node_seconds_total': (
+        'counter', 'Время отрисовки узла шаблона с вложенными.', None),
+    'yatube_template_node_self_seconds_total': (
+        'counter', 'Время узла шаблона без профилируемых вложенных.', None),
+}
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('yatube_metrics_request', default=None)
+_local = threading.local()
+_aggregates = []
+_flushed = time.monotonic()
+_started = time.time_ns() // 1_000_000
+
+
+class _Request:
+    __slots__ = ('request', 'queries', 'query_time', 'render_time',
+                 'rendering')
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+        self.query_time = 0.0
+        self.render_time = 0.0
+        self.rendering = 0
+
+
+def _aggregate():
+    try:
+        return _local.aggregate
+    except AttributeError:
+        _local.aggregate = aggregate = {}
+        _aggregates.append(aggregate)
+        return aggregate
+
+
+def _reset():
+    """После fork у дочернего процесса свои агрегаты и свой файл."""
+    global _local, _started
+    _local = threading.local()
+    _started = time.time_ns() // 1_000_000
+    _aggregates.clear()
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+def inc(name, labels, amount=1):
+    aggregate = _aggregate()
+    key = (name, labels)
+    values = aggregate.get(key)
+    if values is None:
+        values = aggregate[key] = [0]
+    values[0] += amount
+
+
+def observe(name, labels, value):
+    """Добавляет значение в гистограмму: корзины, затем сумма и число."""
+    buckets = METRICS[name][2]
+    aggregate = _aggregate()
+    key = (name, labels)
+    values = aggregate.get(key)
+    if values is None:
+        values = aggregate[key] = [0] * (len(buckets) + 2)
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            values[index] += 1
+            break
+    values[-2] += value
+    values[-1] += 1
+
+
+def snapshot():
+    """Сумма агрегатов всех потоков процесса: {(имя, метки): значения}."""
+    total = {}
+    # Копия словаря делается без переключения потоков, значения после
+    # неё читаются как есть: рассинхрон в одно наблюдение метрикам не важен.
+    for aggregate in list(_aggregates):
+        for key, values in aggregate.copy().items():
+            _add(total, key, values)
+    return total
+
+
+def _add(total, key, values):
+    current = total.get(key)
+    if current is None:
+        total[key] = list(values)
+        return
+    for index, value in enumerate(values):
+        current[index] += value
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+def _file_name():
+    """Имя файла процесса: pid повторяются, время старта — нет."""
+    return f'{os.getpid()}-{_started}.json'
+
+
+def flush():
+    """Сохраняет снимок процесса в METRICS_DIR/<pid>-<старт>.json."""
+    global _flushed
+    _flushed = time.monotonic()
+    query_log.flush(_file_name())
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = os.path.join(settings.METRICS_DIR, _file_name())
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump([[name, labels, values]
+                   for (name, labels), values in snapshot().items()], file)
+    os.replace(temporary, path)
+
+
+@atexit.register
+def _flush_at_exit():
+    if _aggregates:
+        flush()
+
+
+def collect():
+    """Сумма снимков всех процессов; свой снимок сохраняется заново."""
+    flush()
+    total = {}
+    for path in glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        try:
+            with open(path, encoding='utf-8') as file:
+                rows = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, values in rows:
+            if name in METRICS:
+                _add(total, (name, tuple(map(tuple, labels))), values)
+    return total
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n') for _, value in pairs)
+    return '{%s}' % ','.join(
+        f'{name}="{value}"' for (name, _), value in zip(pairs, escaped))
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition(total):
+    """Текстовый формат Prometheus 0.0.4."""
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        rows = sorted((labels, values) for (metric, labels), values
+                      in total.items() if metric == name)
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        for labels, values in rows:
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(labels)} {_number(values[0])}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, values):
+                cumulative += count
+                lines.append(f'{name}_bucket'
+                             f'{_labels(labels + (("le", bound),))} '
+                             f'{cumulative}')
+            lines.append(f'{name}_bucket'
+                         f'{_labels(labels + (("le", "+Inf"),))} '
+                         f'{values[-1]}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(values[-2])}')
+            lines.append(f'{name}_count{_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(collect()), content_type=CONTENT_TYPE)
+
+
+def _track_query(execute, sql, params, many, context):
+    request = _current.get()
+    if request is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        request.queries += 1
+        request.query_time += elapsed
+        query_log.record(view_name(request.request), sql, params, elapsed)
+
+
+def instrument(connection, **kwargs):
+    if _track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track_query)
+
+
+connection_created.connect(instrument)
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, context=None, request=None):
+        current = _current.get()
+        if current is None:
+            return super().render(context, request)
+        # Шаблон, отрисованный изнутри другого (render_to_string в теге),
+        # уже входит во время внешнего.
+        current.rendering += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            current.rendering -= 1
+            if not current.rendering:
+                current.render_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """DjangoTemplates, который считает время отрисовки для метрик."""
+
+    def __init__(self, params):
+        super().__init__(params)
+        if settings.TEMPLATE_PROFILING:
+            from yatube import template_profiler
+
+            template_profiler.enable()
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self)
+
+
+def _record(request, response, current, elapsed):
+    view = view_name(request)
+    if view == 'metrics':
+        return
+    inc('yatube_http_requests_total', (
+        ('view', view), ('method', request.method),
+        ('status', response.status_code)))
+    labels = (('view', view),)
+    observe('yatube_http_request_duration_seconds', labels, elapsed)
+    if not response.streaming:
+        observe('yatube_http_response_size_bytes', labels,
+                len(response.content))
+    inc('yatube_db_queries_total', labels, current.queries)
+    inc('yatube_db_query_seconds_total', labels, current.query_time)
+    inc('yatube_template_render_seconds_total', labels, current.render_time)
+    if time.monotonic() - _flushed < settings.METRICS_FLUSH_INTERVAL:
+        return
+    try:
+        flush()
+    except OSError:
+        logger.exception('Не удалось сохранить метрики в %s',
+                         settings.METRICS_DIR)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            current = _Request(request)
+            token = _current.set(current)
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            _record(request, response, current,
+                    time.perf_counter() - started)
+            return response
+    else:
+        def middleware(request):
+            instrument(connection)
+            current = _Request(request)
+            token = _current.set(current)
+            started = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            _record(request, response, current,
+                    time.perf_counter() - started)
+            return response
+    return middleware
@@ -0,0 +1,175 @@
+"""Журнал запросов к базе по отпечаткам SQL.
+
+Обёртка execute_wrapper из yatube/metrics.py передаёт сюда каждый запрос,
+выполненный во время ответа. Отпечаток — SQL без значений: литералы и
+параметры заменены на «?», списки IN (...) и VALUES свёрнуты, поэтому
+один вызов ORM даёт один отпечаток при любых аргументах. По паре
+(отпечаток, маршрут) копятся число запросов, суммарное и наибольшее время.
+
+Агрегаты устроены как у метрик: у потока свой словарь, процесс сохраняет
+их сумму в METRICS_DIR/queries/ вместе с метриками и под тем же именем
+файла (pid и время старта). Команда top_queries складывает файлы всех
+воркеров. Запросы дольше SLOW_QUERY_THRESHOLD секунд с вероятностью
+SLOW_QUERY_SAMPLE_RATE пишутся с параметрами и местом вызова в логгер
+yatube.slow_queries (в settings.LOGGING — файл SLOW_QUERY_LOG, который
+ротирует logrotate).
+"""
+import json
+import logging
+import os
+import random
+import re
+import threading
+import traceback
+from functools import lru_cache
+from glob import glob
+
+from django.conf import settings
+
+COUNT, TOTAL, MAX = range(3)
+ORDERS = {
+    'total': lambda values: values[TOTAL],
+    'count': lambda values: values[COUNT],
+    'max': lambda values: values[MAX],
+    'mean': lambda values: values[TOTAL] / values[COUNT],
+}
+PARAMS_LIMIT = 1000
+
+SAVEPOINT = re.compile(r'\bSAVEPOINT "[^"]*"', re.I)
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?(?:e[-+]?\d+)?\b', re.I)
+PLACEHOLDERS = re.compile(r'%s|\?')
+IN_LIST = re.compile(r'\bIN \(\?(?:, ?\?)*\)', re.I)
+ROWS = re.compile(r'\((\?(?:, ?\?)*)\)(?:, ?\(\1\))+')
+SPACES = re.compile(r'\s+')
+
+slow_log = logging.getLogger('yatube.slow_queries')
+
+_local = threading.local()
+_aggregates = []
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """SQL без значений: одинаковый для вызовов ORM с разными аргументами."""
+    sql = SAVEPOINT.sub('SAVEPOINT ?', sql)
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = PLACEHOLDERS.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    sql = ROWS.sub(r'(\1), ...', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def _aggregate():
+    try:
+        return _local.aggregate
+    except AttributeError:
+        _local.aggregate = aggregate = {}
+        _aggregates.append(aggregate)
+        return aggregate
+
+
+def _reset():
+    global _local
+    _local = threading.local()
+    _aggregates.clear()
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+def record(view, sql, params, elapsed):
+    key = (fingerprint(sql), view)
+    aggregate = _aggregate()
+    values = aggregate.get(key)
+    if values is None:
+        values = aggregate[key] = [0, 0.0, 0.0]
+    values[COUNT] += 1
+    values[TOTAL] += elapsed
+    if elapsed > values[MAX]:
+        values[MAX] = elapsed
+    if (elapsed >= settings.SLOW_QUERY_THRESHOLD
+            and random.random() < settings.SLOW_QUERY_SAMPLE_RATE):
+        slow_log.warning(
+            '%.1f ms view=%s at %s\n%s\nparams=%.*r',
+            elapsed * 1000, view, caller(), sql, PARAMS_LIMIT, params)
+
+
+def caller():
+    """Последний кадр стека в коде проекта: строка ORM, давшая запрос."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    for frame in reversed(traceback.extract_stack()):
+        path = os.path.abspath(frame.filename)
+        if (path.startswith(settings.BASE_DIR)
+                and not path.startswith(here)
+                and 'site-packages' not in path):
+            path = os.path.relpath(path, settings.BASE_DIR)
+            return f'{path}:{frame.lineno}'
+    return '?'
+
+
+def _merge(total, key, values):
+    current = total.get(key)
+    if current is None:
+        total[key] = list(values)
+        return
+    current[COUNT] += values[COUNT]
+    current[TOTAL] += values[TOTAL]
+    current[MAX] = max(current[MAX], values[MAX])
+
+
+def snapshot():
+    """Агрегаты всех потоков процесса: {(отпечаток, маршрут): значения}."""
+    total = {}
+    for aggregate in list(_aggregates):
+        for key, values in aggregate.copy().items():
+            _merge(total, key, values)
+    return total
+
+
+def directory():
+    return os.path.join(settings.METRICS_DIR, 'queries')
+
+
+def flush(name):
+    """Сохраняет агрегаты процесса в файл name каталога directory()."""
+    os.makedirs(directory(), exist_ok=True)
+    path = os.path.join(directory(), name)
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump([[sql, view, values]
+                   for (sql, view), values in snapshot().items()], file)
+    os.replace(temporary, path)
+
+
+def collect():
+    """Сумма сохранённых агрегатов всех процессов."""
+    total = {}
+    for path in glob(os.path.join(directory(), '*.json')):
+        try:
+            with open(path, encoding='utf-8') as file:
+                rows = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for sql, view, values in rows:
+            _merge(total, (sql, view), values)
+    return total
+
+
+def top(total, limit=20, order='total', per_view=False, view=None):
+    """Самые тяжёлые отпечатки: [(отпечаток, маршруты, значения)].
+
+    Без per_view строки одного отпечатка из разных маршрутов складываются.
+    """
+    rows, views = {}, {}
+    for (sql, name), values in total.items():
+        if view is not None and name != view:
+            continue
+        key = (sql, name) if per_view else sql
+        _merge(rows, key, values)
+        views.setdefault(key, set()).add(name)
+    ranked = sorted(
+        rows, key=lambda key: ORDERS[order](rows[key]), reverse=True)
+    return [(key[0] if per_view else key, sorted(views[key]), rows[key])
+            for key in ranked[:limit]]
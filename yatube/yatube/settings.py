@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -21,6 +25,15 @@ load_dotenv()
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Тесты (manage.py test и pytest) и их дочерние процессы держат общий кэш
+# и прочие файлы во временном каталоге: cache.clear() в тестах не должен
+# стирать кэш рабочей копии.
+if ((sys.argv[1:2] == ['test'] or 'pytest' in sys.modules)
+        and not os.getenv('YATUBE_TEST_DIR')):
+    os.environ['YATUBE_TEST_DIR'] = tempfile.mkdtemp(prefix='yatube-test-')
+    atexit.register(shutil.rmtree, os.environ['YATUBE_TEST_DIR'], True)
+TEST_DIR = os.getenv('YATUBE_TEST_DIR')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -57,6 +70,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,7 +90,9 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, который замеряет отрисовку для /metrics.
+        'BACKEND': 'yatube.metrics.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -90,7 +106,15 @@ TEMPLATES = [
     },
 ]
 
+# Время отрисовки по узлам include/cache/feedcache/thumbnail в /metrics
+# (yatube/template_profiler.py). Замедляет отрисовку, включать на время.
+TEMPLATE_PROFILING = os.getenv('TEMPLATE_PROFILING', '0') == '1'
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
+ASGI_APPLICATION = 'yatube.asgi.application'
+# Страницы чтения как async-вьюхи (posts/async_views.py). Включает
+# yatube/asgi.py; под WSGI они работали бы через async_to_sync без пользы.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', '0') == '1'
 
 
 # Database
@@ -99,7 +123,8 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.getenv(
+            'DATABASE_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
     }
 }
 
@@ -150,8 +175,102 @@ LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "posts:index"
 LOGOUT_REDIRECT_URL = "posts:index"
 
+# Общий для всех воркеров кэш в файле SQLite (см. yatube/sqlite_cache.py).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.sqlite_cache.SQLiteCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(
+            TEST_DIR or BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 2 ** 20,
+        },
     }
 }
+
+# Метрики вьюх (yatube/metrics.py). Воркеры на машине сохраняют свои
+# агрегаты в METRICS_DIR, /metrics отдаёт их сумму адресам из
+# METRICS_ALLOWED_IPS. У тестов — свой каталог в TEST_DIR.
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(
+    TEST_DIR or tempfile.gettempdir(), 'yatube-metrics'))
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+
+# Медленные запросы к базе (yatube/query_log.py): доля SLOW_QUERY_SAMPLE_RATE
+# запросов дольше SLOW_QUERY_THRESHOLD секунд пишется в SLOW_QUERY_LOG.
+# Файл общий для всех воркеров, поэтому ротирует его logrotate, а не сами
+# воркеры: WatchedFileHandler переоткрывает файл после переименования.
+SLOW_QUERY_THRESHOLD = 0.05
+SLOW_QUERY_SAMPLE_RATE = 0.1
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', os.path.join(
+    TEST_DIR or tempfile.gettempdir(), 'yatube-slow-queries.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'slow_queries': {'format': '%(asctime)s pid=%(process)d %(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'formatter': 'slow_queries',
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'delay': True,
+            'encoding': 'utf-8',
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Фоновые задачи (posts/jobs.py) в таблице posts_job, их выполняет
+# manage.py run_workers. Без DEBUG задачи ставятся в очередь, в разработке и
+# тестах выполняются сразу.
+JOBS_ASYNC = not DEBUG
+JOBS_WORKERS = 2
+JOBS_BATCH_SIZE = 20
+JOBS_VISIBILITY_TIMEOUT = 300
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 10
+JOBS_RETRY_BACKOFF_MAX = 60 * 60
+
+# Лента «Избранные авторы»: раскладка новых постов по подписчикам
+# фоновой задачей.
+# Посты авторов с большим числом подписчиков подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 5000
+TIMELINE_CELEBRITIES_TIMEOUT = 300
+TIMELINE_BATCH_SIZE = 1000
+
+# Фрагменты лент живут до смены поколения, TTL — страховка.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+FEED_CACHE_LOCK_TIMEOUT = 10
+# Подписки пользователя (posts/follow_graph.py): сбрасываются сменой
+# поколения, TTL — страховка.
+FOLLOWEES_CACHE_TIMEOUT = 60 * 60 * 24
+# Страницы для анонимов сбрасываются сигналами, TTL — страховка.
+PAGE_CACHE_TIMEOUT = 60 * 10
+# Поиск: лучшие SEARCH_RESULTS_LIMIT постов запроса ранжируются один раз
+# на поколение и листаются из кэша (posts/search.py).
+SEARCH_RESULTS_LIMIT = 1000
+SEARCH_SNAPSHOT_TIMEOUT = 60 * 30
+
+# Миниатюры картинок постов, которые используют шаблоны. Создаются фоновой
+# задачей после сохранения поста; THUMBNAIL_WORKERS — процессы команды
+# generate_thumbnails.
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_WORKERS = 2
+
+# Письма (уведомления о комментариях) в разработке печатаются в консоль.
+EMAIL_BACKEND = os.getenv(
+    'EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'yatube@localhost')
+# Адрес сайта для ссылок в письмах: задачи выполняются вне запроса.
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:8000')
@@ -0,0 +1,31 @@
+"""Настройки продакшена: DJANGO_SETTINGS_MODULE=yatube.settings_production.
+
+Отличия от yatube.settings: без DEBUG и debug_toolbar, фоновые задачи идут
+через очередь (manage.py run_workers), а шаблоны разбирает один раз на
+процесс cached.Loader. Django 4.1 включает его и сам, пока OPTIONS['loaders']
+не заданы; здесь список задан явно, чтобы кэш не пропал при настройке
+загрузчиков.
+"""
+from yatube.settings import *  # noqa: F401,F403
+from yatube.settings import INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+DEBUG = False
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
+MIDDLEWARE = [name for name in MIDDLEWARE if 'debug_toolbar' not in name]
+
+JOBS_ASYNC = True
+
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
@@ -0,0 +1,231 @@
+"""Общий для всех воркеров кэш в файле SQLite.
+
+LocMemCache у каждого процесса свой: попадания падают с ростом числа
+воркеров, а сброс поколения в одном воркере не виден остальным. Этот бэкенд
+хранит записи в одном файле базы (режим WAL), поэтому его видят все процессы
+на машине, и не требует memcached или redis.
+
+Записи вытесняются по давности обращения (LRU), когда их становится больше
+MAX_ENTRIES или суммарный размер превышает MAX_SIZE байт. Время обращения
+обновляется не чаще раза в ACCESS_RESOLUTION секунд, чтобы чтение почти
+никогда не превращалось в запись. Целые числа хранятся как INTEGER, поэтому
+incr() выполняется одним атомарным UPDATE.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.sqlite_cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100000, 'MAX_SIZE': 256 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_stats SET entries = entries + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_stats SET entries = entries - 1, bytes = bytes - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_resize AFTER UPDATE OF size ON cache BEGIN
+    UPDATE cache_stats SET bytes = bytes + NEW.size - OLD.size;
+END;
+"""
+
+NOT_EXPIRED = '(expires IS NULL OR expires > ?)'
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = options.get('MAX_SIZE')
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 1.0)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и процесса: после fork
+        # унаследованное соединение SQLite использовать нельзя.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection, self._local.pid = connection, pid
+        return self._local.connection
+
+    def _encode(self, value):
+        if type(value) is int:
+            return value, 8
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        return pickled, len(pickled)
+
+    @staticmethod
+    def _decode(value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def _write(self, sql, params):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = db.execute(sql, params)
+            self._cull(db)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return cursor.rowcount
+
+    def _store(self, key, value, timeout, only_if_missing):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        encoded, size = self._encode(value)
+        sql = (
+            'INSERT INTO cache (key, value, expires, accessed, size) '
+            'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed, size = excluded.size'
+        )
+        params = (key, encoded, expires, now, size)
+        if only_if_missing:
+            sql += ' WHERE cache.expires IS NOT NULL AND cache.expires <= ?'
+            params += (now,)
+        return self._write(sql, params)
+
+    def _cull(self, db):
+        entries, size = db.execute(
+            'SELECT entries, bytes FROM cache_stats').fetchone()
+        over_size = self._max_size is not None and size > self._max_size
+        if entries <= self._max_entries and not over_size:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        if self._cull_frequency == 0:
+            db.execute('DELETE FROM cache')
+            return
+        entries, size = db.execute(
+            'SELECT entries, bytes FROM cache_stats').fetchone()
+        if entries > self._max_entries:
+            self._evict(db, entries // self._cull_frequency)
+        while self._max_size is not None and size > self._max_size:
+            self._evict(db, max(1, entries // self._cull_frequency))
+            entries, size = db.execute(
+                'SELECT entries, bytes FROM cache_stats').fetchone()
+
+    @staticmethod
+    def _evict(db, count):
+        db.execute(
+            'DELETE FROM cache WHERE key IN '
+            '(SELECT key FROM cache ORDER BY accessed LIMIT ?)', (count,))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._store(key, value, timeout, only_if_missing=True) > 0
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._store(key, value, timeout, only_if_missing=False)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version=version)
+        return []
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._get_many([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key
+                for key in keys}
+        found = self._get_many(list(keys))
+        return {keys[key]: value for key, value in found.items()}
+
+    def _get_many(self, keys):
+        if not keys:
+            return {}
+        now = time.time()
+        rows = self._db.execute(
+            'SELECT key, value, accessed FROM cache WHERE key IN (%s) AND %s'
+            % (', '.join('?' * len(keys)), NOT_EXPIRED),
+            (*keys, now)
+        ).fetchall()
+        stale = [(now, key) for key, _, accessed in rows
+                 if now - accessed > self._access_resolution]
+        if stale:
+            self._db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', stale)
+        return {key: self._decode(value) for key, value, _ in rows}
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._db.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {NOT_EXPIRED}',
+            (self.get_backend_timeout(timeout), key, time.time()))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._db.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {NOT_EXPIRED}',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._db.execute(
+            'UPDATE cache SET value = value + ? WHERE key = ? '
+            f"AND typeof(value) = 'integer' AND {NOT_EXPIRED} "
+            'RETURNING value',
+            (delta, key, time.time())
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        # Не целое число: как в BaseCache, читаем и записываем заново.
+        value = self._get_many([key]).get(key, self)
+        if value is self:
+            raise ValueError("Key '%s' not found" % key)
+        value += delta
+        self._store(key, value, DEFAULT_TIMEOUT, only_if_missing=False)
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version)
+                for key in keys]
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ?', [(key,) for key in keys])
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
@@ -0,0 +1,77 @@
+"""Профилировщик шаблонов: время отрисовки по узлам include, cache,
+feedcache и thumbnail.
+
+enable() оборачивает render() этих классов узлов. Каждый узел получает
+метки template — «шаблон:строка» — и node — текст тега, а его время
+попадает в метрики yatube_template_node_* (yatube/metrics.py): полное и
+собственное, без вложенных профилируемых узлов. Включается настройкой
+TEMPLATE_PROFILING (бэкенд шаблонов вызывает enable() при создании) или
+скриптом benchmarks.templates. Обёртка стоит лишнего времени на каждом
+узле, поэтому по умолчанию выключена.
+"""
+import contextvars
+import time
+from functools import wraps
+
+from django.template.loader_tags import IncludeNode
+from django.templatetags.cache import CacheNode
+
+from yatube import metrics
+
+_children = contextvars.ContextVar('template_profiler_children', default=None)
+_originals = {}
+
+
+def node_classes():
+    from posts.templatetags.feedcache import FeedCacheNode
+    from sorl.thumbnail.templatetags.thumbnail import ThumbnailNode
+
+    return (IncludeNode, CacheNode, FeedCacheNode, ThumbnailNode)
+
+
+def labels(node):
+    origin = getattr(node, 'origin', None)
+    token = getattr(node, 'token', None)
+    where = origin.template_name if origin else '?'
+    if token is None:
+        return (('template', where), ('node', type(node).__name__))
+    return (('template', f'{where}:{token.lineno}'),
+            ('node', token.contents))
+
+
+def _timed(render):
+    @wraps(render)
+    def wrapper(self, context):
+        parent = _children.get()
+        children = [0.0]
+        token = _children.set(children)
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            _children.reset(token)
+            if parent is not None:
+                parent[0] += elapsed
+            node = labels(self)
+            metrics.inc('yatube_template_node_renders_total', node)
+            metrics.inc('yatube_template_node_seconds_total', node, elapsed)
+            metrics.inc('yatube_template_node_self_seconds_total', node,
+                        elapsed - children[0])
+    return wrapper
+
+
+def enable():
+    for node_class in node_classes():
+        if node_class not in _originals:
+            _originals[node_class] = node_class.__dict__.get('render')
+            node_class.render = _timed(node_class.render)
+
+
+def disable():
+    for node_class, render in _originals.items():
+        if render is None:
+            del node_class.render
+        else:
+            node_class.render = render
+    _originals.clear()
@@ -0,0 +1,301 @@
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template.loader_tags import IncludeNode
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post
+
+from yatube import (metrics, query_log, settings_production,
+                    template_profiler)
+from yatube.sqlite_cache import SQLiteCache
+
+
+def increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_add_delete(self):
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'value'))
+        self.assertEqual(
+            self.cache.get_many(['key', 'new', 'missing']),
+            {'key': {'value': [1, 2]}, 'new': 'value'})
+        self.assertTrue(self.cache.delete('key'))
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expired_entry_is_missing_and_can_be_added(self):
+        self.cache.set('key', 'value', timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'fresh'))
+        self.assertEqual(self.cache.get('key'), 'fresh')
+
+    def test_entries_are_shared_between_instances(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=increment,
+                                   args=(self.location, 100))
+                   for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 400)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.make_cache(
+            MAX_ENTRIES=3, CULL_FREQUENCY=3, ACCESS_RESOLUTION=0)
+        for key in 'abc':
+            cache.set(key, key)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(set(cache.get_many('abcd')), {'a', 'c', 'd'})
+
+    def test_total_size_is_bounded(self):
+        cache = self.make_cache(MAX_SIZE=10_000, ACCESS_RESOLUTION=0)
+        for i in range(20):
+            cache.set(f'key{i}', b'x' * 1000)
+        self.assertLessEqual(len(cache.get_many(
+            f'key{i}' for i in range(20))), 10)
+        self.assertIsNotNone(cache.get('key19'))
+
+
+class MetricsDirTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Текст', author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        settings = override_settings(METRICS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+
+class MetricsTest(MetricsDirTestCase):
+    def value(self, name, *labels):
+        values = metrics.snapshot().get((name, labels))
+        return values and values[-1]
+
+    def test_view_records_latency_queries_templates_and_size(self):
+        view = (('view', 'posts:index'),)
+        before = metrics.snapshot()
+        self.client.get(reverse('posts:index'))
+        after = metrics.snapshot()
+
+        def delta(name, index=-1):
+            old = before.get((name, view))
+            return after[(name, view)][index] - (old[index] if old else 0)
+
+        self.assertEqual(delta('yatube_http_request_duration_seconds'), 1)
+        self.assertEqual(delta('yatube_http_response_size_bytes'), 1)
+        self.assertGreater(delta('yatube_http_response_size_bytes', -2), 0)
+        self.assertGreater(delta('yatube_db_queries_total'), 0)
+        self.assertGreater(delta('yatube_db_query_seconds_total'), 0)
+        self.assertGreater(delta('yatube_template_render_seconds_total'), 0)
+        self.assertIsNotNone(self.value(
+            'yatube_http_requests_total', *view, ('method', 'GET'),
+            ('status', 200)))
+
+    def test_other_threads_are_summed(self):
+        labels = (('view', 'test:thread'),)
+        before = self.value('yatube_db_queries_total', *labels) or 0
+        thread = threading.Thread(
+            target=metrics.inc, args=('yatube_db_queries_total', labels, 3))
+        thread.start()
+        thread.join()
+        metrics.inc('yatube_db_queries_total', labels, 2)
+        self.assertEqual(
+            self.value('yatube_db_queries_total', *labels), before + 5)
+
+    def test_endpoint_sums_worker_files(self):
+        labels = [['view', 'test:worker']]
+        with open(os.path.join(self.directory, '1.json'), 'w') as file:
+            json.dump([['yatube_db_queries_total', labels, [4]],
+                       ['yatube_http_request_duration_seconds', labels,
+                        [1, 0, 2] + [0] * 8 + [0.04, 3]]], file)
+        metrics.inc('yatube_db_queries_total', (('view', 'test:worker'),), 1)
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn(
+            '# TYPE yatube_http_request_duration_seconds histogram', text)
+        self.assertIn('yatube_db_queries_total{view="test:worker"} 5', text)
+        for line in (
+            'yatube_http_request_duration_seconds_bucket'
+            '{view="test:worker",le="0.005"} 1',
+            'yatube_http_request_duration_seconds_bucket'
+            '{view="test:worker",le="0.025"} 3',
+            'yatube_http_request_duration_seconds_bucket'
+            '{view="test:worker",le="+Inf"} 3',
+            'yatube_http_request_duration_seconds_count'
+            '{view="test:worker"} 3',
+        ):
+            self.assertIn(line, text)
+        self.assertTrue(glob.glob(
+            os.path.join(self.directory, f'{os.getpid()}-*.json')))
+
+    def test_reused_pid_keeps_dead_worker_file(self):
+        with mock.patch('os.getpid', return_value=1):
+            metrics.flush()
+            metrics._reset()
+            metrics.flush()
+        self.assertEqual(len(glob.glob(
+            os.path.join(self.directory, '1-*.json'))), 2)
+
+    def test_endpoint_is_limited_to_allowed_addresses(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+
+class QueryLogTest(MetricsDirTestCase):
+    def test_fingerprint_drops_values(self):
+        cases = [
+            ("SELECT * FROM t WHERE a = 'x''y' AND b = 12 AND c = -1.5e3",
+             'SELECT * FROM t WHERE a = ? AND b = ? AND c = ?'),
+            ('SELECT "t2"."id" FROM "t2" WHERE "t2"."id" IN (%s, %s, %s)',
+             'SELECT "t2"."id" FROM "t2" WHERE "t2"."id" IN (...)'),
+            ('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)',
+             'INSERT INTO t (a, b) VALUES (?, ?), ...'),
+            ('SELECT 1\n  FROM t LIMIT 21', 'SELECT ? FROM t LIMIT ?'),
+            ('RELEASE SAVEPOINT "s1400_x40"', 'RELEASE SAVEPOINT ?'),
+        ]
+        for sql, expected in cases:
+            with self.subTest(sql=sql):
+                self.assertEqual(query_log.fingerprint(sql), expected)
+
+    def test_queries_are_aggregated_by_fingerprint_and_view(self):
+        url = reverse('posts:post', args=['author', self.post.id])
+        self.client.get(url)
+        before = query_log.snapshot()
+        cache.clear()
+        self.client.get(url)
+        after = query_log.snapshot()
+        rows = {sql: values for (sql, view), values in after.items()
+                if view == 'posts:post' and 'FROM "posts_post"' in sql}
+        self.assertTrue(rows)
+        for sql, values in rows.items():
+            old = before[(sql, 'posts:post')]
+            self.assertEqual(values[query_log.COUNT], old[0] + 1)
+            self.assertGreater(values[query_log.TOTAL], old[1])
+            self.assertGreaterEqual(values[query_log.MAX], old[2])
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_SAMPLE_RATE=1)
+    def test_slow_queries_are_logged_with_params_and_caller(self):
+        with self.assertLogs('yatube.slow_queries', 'WARNING') as logs:
+            self.client.get(
+                reverse('posts:post', args=['author', self.post.id]))
+        message = '\n'.join(logs.output)
+        self.assertIn('view=posts:post at posts/', message)
+        self.assertIn("params=('author'", message)
+
+    def test_queries_are_saved_next_to_process_metrics(self):
+        self.client.get(reverse('posts:index'))
+        metrics.flush()
+        names = {os.path.basename(path) for path in glob.glob(
+            os.path.join(self.directory, f'{os.getpid()}-*.json'))}
+        self.assertEqual(names, set(os.listdir(query_log.directory())))
+
+    def test_top_queries_sums_workers_and_views(self):
+        for pid, rows in (
+            (1, [['SELECT a', 'posts:index', [2, 0.5, 0.3]],
+                 ['SELECT b', 'posts:index', [10, 0.2, 0.05]]]),
+            (2, [['SELECT a', 'posts:post', [1, 0.4, 0.4]]]),
+        ):
+            os.makedirs(query_log.directory(), exist_ok=True)
+            path = os.path.join(query_log.directory(), f'{pid}.json')
+            with open(path, 'w') as file:
+                json.dump(rows, file)
+        self.assertEqual(query_log.top(query_log.collect()), [
+            ('SELECT a', ['posts:index', 'posts:post'], [3, 0.9, 0.4]),
+            ('SELECT b', ['posts:index'], [10, 0.2, 0.05]),
+        ])
+        out = StringIO()
+        call_command('top_queries', order='count', per_view=True, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn('SELECT b', lines[2])
+        self.assertIn('posts:index', lines[3])
+        self.assertIn('posts:post', lines[-2])
+
+
+class TemplateProfilerTest(MetricsDirTestCase):
+    def setUp(self):
+        super().setUp()
+        template_profiler.enable()
+        self.addCleanup(template_profiler.disable)
+
+    def test_include_and_feedcache_nodes_are_timed(self):
+        before = metrics.snapshot()
+        self.client.get(reverse('posts:index'))
+        after = metrics.snapshot()
+
+        def delta(metric, tag):
+            return sum(
+                values[0] - before.get((name, labels), [0])[0]
+                for (name, labels), values in after.items()
+                if name == metric and tag in dict(labels)['node'])
+
+        self.assertEqual(delta('yatube_template_node_renders_total',
+                               'includes/only_post.html'), 1)
+        self.assertEqual(delta('yatube_template_node_renders_total',
+                               "feedcache 'index'"), 1)
+        total = delta('yatube_template_node_seconds_total', 'feedcache')
+        own = delta('yatube_template_node_self_seconds_total', 'feedcache')
+        self.assertGreater(total, own)
+        self.assertGreater(own, 0)
+        templates = [dict(labels)['template'] for name, labels in after
+                     if name == 'yatube_template_node_renders_total']
+        self.assertIn('base.html:16', templates)
+
+    def test_disable_restores_render(self):
+        template_profiler.disable()
+        self.assertNotIn('__wrapped__', vars(IncludeNode.render))
+        template_profiler.enable()
+        self.assertIn('__wrapped__', vars(IncludeNode.render))
+
+
+class ProductionSettingsTest(SimpleTestCase):
+    def test_templates_are_cached_without_debug(self):
+        options = settings_production.TEMPLATES[0]['OPTIONS']
+        self.assertFalse(settings_production.DEBUG)
+        self.assertEqual(options['loaders'][0][0],
+                         'django.template.loaders.cached.Loader')
+        self.assertNotIn('debug_toolbar', settings_production.INSTALLED_APPS)
+        self.assertTrue(settings_production.JOBS_ASYNC)
@@ -19,6 +19,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from yatube.metrics import metrics_view
+
 handler404 = "posts.views.page_not_found"
 handler500 = "posts.views.server_error"
 
@@ -27,6 +29,8 @@ urlpatterns = [
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path('admin/', admin.site.urls),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
+    path('metrics', metrics_view, name='metrics'),
     path("", include("posts.urls", namespace='posts')),
     #  если нужного шаблона для /auth не нашлось в файле users.urls —
     #  ищем совпадения в файле django.contrib.auth.urls